@@ -0,0 +1,39 @@
+"""Rows per second loaded with executemany() and copy_in() in text and binary format.
+
+    python benchmarks/bench_copy.py [DATABASE_URL] [ROWS]
+"""
+import sys
+import time
+import datetime
+
+import tornpsql
+
+
+def rows(count):
+    now = datetime.datetime.now()
+    return ((i, 'name %d' % i, i * 1.5, now) for i in range(count))
+
+
+def run(db, load):
+    db.execute('truncate bench_copy;')
+    start = time.time()
+    load()
+    return time.time() - start
+
+
+def main(url=None, count=100000):
+    count = int(count)
+    db = tornpsql.Connection(url)
+    db.execute('create temp table bench_copy (id int8, name text, balance float8, at timestamp);')
+    loads = [
+        ('executemany', lambda: db.executemany('insert into bench_copy values (%s, %s, %s, %s);', *rows(count))),
+        ('copy_in text', lambda: db.copy_in('bench_copy', rows(count))),
+        ('copy_in binary', lambda: db.copy_in('bench_copy', rows(count), format='binary')),
+    ]
+    for name, load in loads:
+        elapsed = run(db, load)
+        print('%-15s %7.3fs  %9.0f rows/s' % (name, elapsed, count / elapsed))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,34 @@
+"""Throughput of `select 1` through a shared ConnectionPool as the thread count grows.
+
+    python benchmarks/bench_pool.py [DATABASE_URL]
+"""
+import sys
+import time
+import threading
+
+import tornpsql
+
+
+def run(pool, threads, queries=500):
+    def worker():
+        for _ in range(queries):
+            pool.get('select 1 as one;')
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    [w.start() for w in workers]
+    [w.join() for w in workers]
+    return threads * queries / (time.time() - start)
+
+
+def main(url=None):
+    pool = tornpsql.ConnectionPool(url, minconn=1, maxconn=8)
+    try:
+        for threads in (1, 2, 4, 8, 16, 32):
+            print('%3d threads  %8.0f queries/s  %d connections' % (threads, run(pool, threads), pool.size))
+    finally:
+        pool.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
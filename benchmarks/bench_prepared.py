@@ -0,0 +1,34 @@
+"""Per-query latency of short OLTP queries with the prepared statement cache on and off.
+
+    python benchmarks/bench_prepared.py [DATABASE_URL] [QUERIES]
+"""
+import sys
+import time
+
+import tornpsql
+
+QUERY = """select u.id, u.name, u.email, u.balance
+             from users u
+            where u.id = %s
+              and u.balance >= %s
+              and u.email is not null;"""
+
+
+def run(db, queries):
+    start = time.time()
+    for i in range(queries):
+        db.query(QUERY, i % 10 + 1, 0)
+    return (time.time() - start) / queries
+
+
+def main(url=None, queries=20000):
+    queries = int(queries)
+    for prepared_statements in (0, 100):
+        db = tornpsql.Connection(url, prepared_statements=prepared_statements)
+        run(db, 100)
+        print('cache %-4s %7.1f us/query' % ('on' if prepared_statements else 'off', run(db, queries) * 1e6))
+        db.close()
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
@@ -0,0 +1,36 @@
+"""Memory and build time of Row and CompactRow for a large result set. Needs no database.
+
+    python benchmarks/bench_rows.py [ROWS]
+"""
+import sys
+import time
+import tracemalloc
+from decimal import Decimal
+
+from tornpsql import Row, CompactRow
+
+
+def run(row_class, records, column_names):
+    start = time.time()
+    rows = list(map(row_class.factory(column_names), records))
+    elapsed = time.time() - start
+    del rows
+
+    # traced separately, tracemalloc slows allocation down
+    tracemalloc.start()
+    rows = list(map(row_class.factory(column_names), records))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return elapsed, memory
+
+
+def main(count=500000):
+    column_names = ['id', 'name', 'email', 'balance', 'active']
+    records = [(i, 'name %d' % i, 'user%d@example.com' % i, Decimal(i), i % 2 == 0) for i in range(int(count))]
+    for row_class in (Row, CompactRow):
+        elapsed, memory = run(row_class, records, column_names)
+        print('%-10s %7.3fs  %7.1f MB  %4d bytes/row' % (row_class.__name__, elapsed, memory / 1e6, memory / len(records)))
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:])
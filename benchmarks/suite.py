@@ -0,0 +1,228 @@
+"""Throughput and latency of the core paths, written as JSON to compare across versions.
+
+    python benchmarks/suite.py [--url DATABASE_URL] [--output results.json] [--raw] [--compare old.json]
+                               [--quick] [--only NAME ...]
+
+Each case reports seconds per operation (mean, p50, p99) and operations per second. With `--raw`
+the statements are also run through a bare psycopg2 cursor, and `overhead` is tornpsql's time over
+psycopg2's. `--compare` prints the change of every case present in an earlier result file.
+"""
+import sys
+import json
+import time
+import logging
+import argparse
+import platform
+import threading
+
+import psycopg2
+
+import tornpsql
+from tornpsql import Row, CompactRow
+
+timer = getattr(time, 'perf_counter', time.time)
+
+ROWS = "select g as id, 'name ' || g as name, g * 1.5 as balance, g %% 2 = 0 as active from generate_series(1, %s) g;"
+
+
+def measure(operation, repeat, minimum=.2):
+    """Returns the seconds of `repeat` runs of `operation`, after warming up, repeating until `minimum` seconds."""
+    operation()
+    latencies = []
+    started = timer()
+    while len(latencies) < repeat or timer() - started < minimum:
+        start = timer()
+        operation()
+        latencies.append(timer() - start)
+    return latencies
+
+
+def summary(latencies, ops=1):
+    latencies = sorted(latencies)
+    mean = sum(latencies) / len(latencies)
+    return dict(runs=len(latencies), mean=mean, p50=latencies[len(latencies) // 2],
+                p99=latencies[min(len(latencies) - 1, int(len(latencies) * .99))], ops_per_sec=ops / mean)
+
+
+class Suite(object):
+    def __init__(self, url, quick=False, raw=False):
+        self.url = url
+        self.quick = quick
+        self.raw = raw
+        self.db = tornpsql.Connection(url)
+        self.psycopg2 = self.db._db if raw else None
+        self.results = []
+
+    def case(self, name, operation, raw=None, repeat=200, ops=1, **params):
+        """Measures `operation`, and `raw`, its psycopg2 equivalent, in raw mode."""
+        repeat = max(repeat // 10, 3) if self.quick else repeat
+        result = dict(name=name, params=params, **summary(measure(operation, repeat), ops))
+        if raw is not None and self.raw:
+            result['raw'] = summary(measure(raw, repeat), ops)
+            result['overhead'] = result['mean'] / result['raw']['mean']
+        self.results.append(result)
+        print('%-28s %-22s %10.1f us  %10.0f ops/s%s' % (
+            name, ' '.join('%s=%s' % item for item in sorted(params.items())), result['mean'] * 1e6,
+            result['ops_per_sec'], '  x%.2f psycopg2' % result['overhead'] if 'overhead' in result else ''))
+
+    def raw_fetch(self, query, *parameters):
+        def fetch():
+            cursor = self.psycopg2.cursor()
+            cursor.execute(query, parameters)
+            cursor.fetchall()
+            cursor.close()
+        return fetch
+
+    def bench_query(self):
+        for size in (1, 100, 10000):
+            self.case('query', lambda: self.db.query(ROWS, size), self.raw_fetch(ROWS, size),
+                      repeat=max(2000 // size, 20), rows=size)
+        self.case('get', lambda: self.db.get(ROWS, 1), self.raw_fetch(ROWS, 1), repeat=2000)
+
+    def bench_iter(self):
+        def raw_iter(size):
+            def run():
+                cursor = self.psycopg2.cursor('bench', withhold=True)
+                cursor.itersize = self.db.itersize
+                cursor.execute(ROWS, (size, ))
+                for _ in cursor:
+                    pass
+                cursor.close()
+            return run
+
+        for size in (10000, 100000):
+            self.case('iter', lambda: sum(1 for _ in self.db.iter(ROWS, size)), raw_iter(size),
+                      repeat=10, ops=size, rows=size)
+
+    def bench_rows(self):
+        names = ['id', 'name', 'balance', 'active']
+        records = [(i, 'name %d' % i, i * 1.5, i % 2 == 0) for i in range(10000)]
+        for row_class in (Row, CompactRow):
+            factory = row_class.factory(names)
+            self.case('rows', lambda: list(map(factory, records)), repeat=20, ops=len(records),
+                      row_class=row_class.__name__)
+
+    def bench_executemany(self):
+        self.db.execute('create temp table bench_suite (id int8, name text, balance float8);')
+        for size in (10, 1000):
+            args = [(i, 'name %d' % i, i * 1.5) for i in range(size)]
+
+            def raw():
+                cursor = self.psycopg2.cursor()
+                cursor.executemany('insert into bench_suite values (%s, %s, %s);', args)
+                cursor.close()
+
+            self.case('executemany', lambda: self.db.executemany('insert into bench_suite values (%s, %s, %s);', *args),
+                      raw, repeat=max(2000 // size, 5), ops=size, rows=size)
+            self.db.execute('truncate bench_suite;')
+
+    def bench_mogrify(self):
+        def raw():
+            cursor = self.psycopg2.cursor()
+            cursor.mogrify('select %s, %s, %s;', (1, 'name', 1.5))
+            cursor.close()
+
+        self.case('mogrify', lambda: self.db.mogrify('select %s, %s, %s;', 1, 'name', 1.5), raw, repeat=5000)
+        self.case('mogrify', lambda: self.db.mogrify('select %(a)s, %(b)s, %(c)s;', a=1, b='name', c=1.5),
+                  repeat=5000, kwargs=True)
+
+    def bench_logging(self):
+        """Cost of the statement log, handled by a handler that drops the records."""
+        db = tornpsql.Connection(self.url, enable_logging=True)
+        logger = logging.getLogger()
+        level, handlers = logger.level, logger.handlers
+        logger.setLevel(logging.INFO)
+        logger.handlers = [logging.NullHandler()]
+        try:
+            for enabled in (False, True):
+                db._logging = enabled
+                self.case('log', lambda: db.get('select %s as x;', 1), repeat=2000, enabled=enabled)
+        finally:
+            logger.setLevel(level)
+            logger.handlers = handlers
+            db.close()
+
+    def bench_instrument(self):
+        db = tornpsql.Connection(self.url, instrument=True)
+        self.case('instrument', lambda: db.get('select %s as x;', 1), repeat=2000)
+        db.close()
+
+    def bench_pubsub(self):
+        """Time from publishing a notification to its delivery by PubSub, and publish_many throughput."""
+        listener = tornpsql.Connection(self.url)
+        pubsub = listener.pubsub()
+        pubsub.subscribe(['bench_suite'])
+        publisher = self.db.pubsub()
+
+        def roundtrip():
+            publisher.publish('bench_suite', 'x')
+            while not pubsub._poll(1):
+                pass
+
+        self.case('pubsub', roundtrip, repeat=500)
+
+        messages = [('bench_suite', str(i)) for i in range(1000)]
+
+        def publish_many():
+            publisher.publish_many(messages)
+            received = 0
+            while received < len(messages):
+                received += len(pubsub._poll(1))
+
+        self.case('pubsub.publish_many', publish_many, repeat=10, ops=len(messages))
+        pubsub.close()
+        listener.close()
+
+    def bench_concurrency(self):
+        pool = tornpsql.ConnectionPool(self.url, minconn=1, maxconn=16)
+        for threads in (1, 4, 16):
+            def run():
+                workers = [threading.Thread(target=lambda: [pool.get('select 1 as one;') for _ in range(100)])
+                           for _ in range(threads)]
+                [w.start() for w in workers]
+                [w.join() for w in workers]
+
+            self.case('pool.get', run, repeat=5, ops=threads * 100, threads=threads)
+        pool.close()
+
+    def run(self, only=None):
+        for name in sorted(dir(self)):
+            if name.startswith('bench_') and (not only or name[6:] in only):
+                getattr(self, name)()
+        return dict(tornpsql=tornpsql.version, psycopg2=psycopg2.__version__, python=platform.python_version(),
+                    server_version=self.db._db.server_version, time=time.time(), raw=self.raw, quick=self.quick,
+                    results=self.results)
+
+
+def compare(results, path):
+    """Prints the change in mean time of every case also in the results at `path`."""
+    with open(path) as r:
+        old = dict((json.dumps([c['name'], c['params']], sort_keys=True), c) for c in json.load(r)['results'])
+    for case in results['results']:
+        before = old.get(json.dumps([case['name'], case['params']], sort_keys=True))
+        if before:
+            print('%-28s %-22s %+7.1f%%' % (case['name'], ' '.join('%s=%s' % item for item in sorted(case['params'].items())),
+                                            (case['mean'] / before['mean'] - 1) * 100))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--url', default=None, help='database url, DATABASE_URL by default')
+    parser.add_argument('--output', help='file the JSON results are written to')
+    parser.add_argument('--raw', action='store_true', help='also run the statements through bare psycopg2')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare with')
+    parser.add_argument('--quick', action='store_true', help='a tenth of the runs, for a smoke test')
+    parser.add_argument('--only', nargs='*', help='cases to run, e.g. query iter pubsub')
+    args = parser.parse_args(argv)
+
+    results = Suite(args.url, args.quick, args.raw).run(args.only)
+    if args.output:
+        with open(args.output, 'w') as w:
+            json.dump(results, w, indent=2, sort_keys=True)
+    if args.compare:
+        compare(results, args.compare)
+    return results
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -18,4 +18,6 @@ setup(name='tornpsql',
       include_package_data=True,
       zip_safe=True,
       install_requires=["psycopg2>=2.5.2"],
+      extras_require={"tornado": ["tornado>=4.0"],
+                      "numpy": ["numpy"]},
       entry_points="")
@@ -0,0 +1,120 @@
+import sys
+import time
+import unittest
+
+import tornpsql
+
+
+def run(coroutine):
+    import asyncio
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def setUpModule():
+    if sys.version_info >= (3, 6):
+        import asyncio
+        asyncio.set_event_loop(asyncio.new_event_loop())
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'asyncio support requires python 3.6+')
+class AsyncConnectionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = tornpsql.AsyncConnection(database="tornpsql")
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_query(self):
+        "can query without blocking"
+        self.assertTrue(run(self.db.get("select true as connected")).connected)
+        self.assertListEqual(run(self.db.query("SELECT x from generate_series(1,10) x where x > %s and x < %s;", 1, 4)),
+                             [{'x': 2}, {'x': 3}])
+
+    def test_kwargs(self):
+        "can query from keyword arguments"
+        self.assertDictEqual(run(self.db.get("SELECT x from generate_series(1,10) x where x=%(id)s;", id=1)), dict(x=1))
+
+    def test_execute(self):
+        "execute returns None"
+        self.assertIsNone(run(self.db.execute("select 1;")))
+
+    def test_mogrify(self):
+        "mogrify needs an open connection"
+        self.assertRaises(tornpsql.InterfaceError, self.db.mogrify, "select %s;", 1)
+        run(self.db.connect())
+        self.assertEqual(self.db.mogrify("select %s;", 1), b"select 1;")
+
+    def test_assert_one_row(self):
+        "only one row can be returned with get"
+        self.assertRaises(ValueError, run, self.db.get("select * from users"))
+
+    def test_raises_exceptions(self):
+        "raises psycopg2 exceptions and stays usable"
+        self.assertRaises(tornpsql.ProgrammingError, run, self.db.query("st nothing from th;"))
+        self.assertTrue(run(self.db.get("select true as connected")).connected)
+
+    def test_search_path(self):
+        "sets the search_path when connecting"
+        db = tornpsql.AsyncConnection(database="tornpsql", search_path="other")
+        self.assertEqual(run(db.get("show search_path;")).search_path, "other")
+
+    def test_iter(self):
+        "can iterate over records"
+        rows = self.db.iter("select x from generate_series(1, 3) x;")
+        self.assertEqual([run(rows.__anext__()).x for _ in range(3)], [1, 2, 3])
+        self.assertRaises(StopAsyncIteration, run, rows.__anext__())
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'asyncio support requires python 3.6+')
+class AsyncConnectionPoolTestCase(unittest.TestCase):
+    def test_concurrent_queries(self):
+        "runs queries concurrently on one thread"
+        import asyncio
+        pool = tornpsql.AsyncConnectionPool(database="tornpsql", maxconn=10)
+        start = time.time()
+        rows = run(asyncio.gather(*[pool.get("select pg_sleep(.2), %s as n", n) for n in range(20)]))
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([row.n for row in rows], list(range(20)))
+        pool.close()
+
+    def test_timeout(self):
+        "raises PoolTimeout when no connection is released in time"
+        import asyncio
+        pool = tornpsql.AsyncConnectionPool(database="tornpsql", maxconn=1, timeout=.1)
+        self.assertRaises(tornpsql.PoolTimeout, run,
+                          asyncio.gather(pool.execute("select pg_sleep(.5);"), pool.execute("select 1;")))
+        pool.close()
+
+
+@unittest.skipIf(sys.version_info < (3, 6), 'asyncio support requires python 3.6+')
+class AsyncPubSubTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = tornpsql.Connection(database="tornpsql")
+        self.pubsub = self.db.pubsub()
+        self.pubsub.subscribe(['aio'])
+        self.publisher = tornpsql.Connection(database="tornpsql")
+
+    def tearDown(self):
+        self.db.close()
+        self.publisher.close()
+
+    def test_alisten(self):
+        "receives notifications on the event loop, subscribing while iterating"
+        notifies = self.pubsub.alisten()
+        self.publisher.execute("select pg_notify('aio', 'one');")
+        self.assertEqual(run(notifies.__anext__()).payload, 'one')
+        self.pubsub.subscribe(['aio_other'])
+        self.publisher.execute("select pg_notify('aio_other', 'two');")
+        self.assertEqual(run(notifies.__anext__()).payload, 'two')
+        self.pubsub.unsubscribe()
+        self.assertRaises(StopAsyncIteration, run, notifies.__anext__())
+
+    def test_cancel(self):
+        "unlistens when the iteration is cancelled"
+        import asyncio
+        task = asyncio.ensure_future(self.pubsub.alisten().__anext__())
+        run(asyncio.sleep(.05))
+        task.cancel()
+        self.assertRaises(asyncio.CancelledError, run, task)
+        self.assertEqual(self.pubsub.channels, [])
+        self.assertListEqual(self.db.query("select pg_listening_channels() as c;"), [])
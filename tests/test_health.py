@@ -0,0 +1,68 @@
+import time
+import unittest
+
+import tornpsql
+from tornpsql.health import HealthMonitor, monitor
+
+
+class HealthMonitorTestCase(unittest.TestCase):
+    def test_keepalives(self):
+        "passes the keepalive settings to libpq"
+        db = tornpsql.Connection(database="tornpsql", keepalives_idle=30, keepalives_count=3)
+        self.assertEqual(db._db.get_dsn_parameters()['keepalives_idle'], '30')
+        self.assertEqual(db._db.get_dsn_parameters()['keepalives_count'], '3')
+        self.assertNotIn('keepalives', tornpsql.Connection(database="tornpsql")._db_args)
+
+    def test_reconnects_idle_connections(self):
+        "pings idle connections and reconnects those that fail"
+        health = HealthMonitor()
+        db = tornpsql.Connection(database="tornpsql", health_check=0)
+        health.watch(db)
+        health.check()
+        self.assertTrue(db.healthy)
+        self.assertGreater(db.ping_latency, 0)
+
+        pid = db._db.get_backend_pid()
+        tornpsql.Connection(database="tornpsql").execute("select pg_terminate_backend(%s);", pid)
+        time.sleep(.05)
+        health.check()
+        self.assertFalse(db.healthy)
+        self.assertTrue(db.get("select true as connected;").connected)
+        self.assertTrue(db.healthy)
+        self.assertNotEqual(db._db.get_backend_pid(), pid)
+        health.close()
+
+    def test_skips_busy_connections(self):
+        "leaves recently used connections and transactions alone"
+        health = HealthMonitor()
+        db = tornpsql.Connection(database="tornpsql", health_check=60)
+        health.watch(db)
+        health.check()
+        self.assertIsNone(db.ping_latency)
+
+        db = tornpsql.Connection(database="tornpsql", health_check=0)
+        db.execute("begin;")
+        health.watch(db)
+        health.check()
+        self.assertIsNone(db.ping_latency)
+        db.execute("rollback;")
+        health.check()
+        self.assertIsNotNone(db.ping_latency)
+
+        # the owner may start a transaction at any time, which a ping's rollback would end
+        db = tornpsql.TransactionalConnection(database="tornpsql", health_check=0)
+        db.execute("create temp table pinged (id int); insert into pinged values (1);")
+        db.commit()
+        health.watch(db)
+        health.check()
+        self.assertIsNone(db.ping_latency)
+        db.execute("insert into pinged values (2);")
+        health.check()
+        db.commit()
+        self.assertEqual(db.get("select count(*) from pinged;").count, 2)
+        health.close()
+
+    def test_shared_monitor(self):
+        "registers connections with a health_check with the shared monitor"
+        db = tornpsql.Connection(database="tornpsql", health_check=.1)
+        self.assertIn(db, list(monitor()._connections))
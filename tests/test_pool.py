@@ -0,0 +1,141 @@
+import time
+import unittest
+import threading
+
+import tornpsql
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = tornpsql.ConnectionPool(database="tornpsql", minconn=1, maxconn=2, timeout=.1)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_prefill(self):
+        "opens minconn connections up front"
+        self.assertEqual(self.pool.size, 1)
+        self.assertEqual(self.pool.idle, 1)
+
+    def test_query_api(self):
+        "exposes the Connection query api"
+        self.assertTrue(self.pool.get("select true as connected").connected)
+        self.assertListEqual(self.pool.query("SELECT x from generate_series(1,3) x where x > %(g)s;", g=1), [{'x': 2}, {'x': 3}])
+        self.assertEqual(self.pool.mogrify("select %s;", 1), b"select 1;")
+        self.assertIsNone(self.pool.execute("select 1;"))
+        self.assertEqual(self.pool.idle, self.pool.size)
+
+    def test_checkout_timeout(self):
+        "raises PoolTimeout once maxconn connections are checked out"
+        a, b = self.pool.getconn(), self.pool.getconn()
+        self.assertRaises(tornpsql.PoolTimeout, self.pool.getconn)
+        self.pool.putconn(a)
+        self.assertIs(self.pool.getconn(), a)
+        self.pool.putconn(a)
+        self.pool.putconn(b)
+
+    def test_putconn_twice(self):
+        "refuses connections returned twice or not checked out"
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        self.assertRaises(tornpsql.PoolError, self.pool.putconn, conn)
+        self.assertRaises(tornpsql.PoolError, self.pool.putconn, tornpsql.Connection(database="tornpsql"))
+        self.assertEqual(self.pool.idle, 1)
+
+    def test_blocking_checkout(self):
+        "waits for a connection to be returned"
+        a, b = self.pool.getconn(), self.pool.getconn()
+        threading.Timer(.05, self.pool.putconn, (a, )).start()
+        self.assertIs(self.pool.getconn(timeout=1), a)
+        self.pool.putconn(a)
+        self.pool.putconn(b)
+
+    def test_idle_eviction(self):
+        "closes surplus idle connections after max_idle"
+        self.pool.max_idle = .01
+        a, b = self.pool.getconn(), self.pool.getconn()
+        self.pool.putconn(a)
+        self.pool.putconn(b)
+        self.assertEqual(self.pool.size, 2)
+        time.sleep(.02)
+        self.pool.putconn(self.pool.getconn())
+        self.assertEqual(self.pool.size, 1)
+
+    def test_max_lifetime(self):
+        "recycles connections older than max_lifetime"
+        self.pool.max_lifetime = 0
+        conn = self.pool.getconn()
+        self.pool.putconn(conn)
+        self.assertIsNone(conn._db)
+        self.assertEqual(self.pool.size, 0)
+
+    def test_health_check(self):
+        "reconnects broken connections on checkout"
+        self.pool.check_after = 0
+        conn = self.pool.getconn()
+        pid = conn.get("select pg_backend_pid() as pid").pid
+        self.pool.putconn(conn)
+        tornpsql.Connection(database="tornpsql").execute("select pg_terminate_backend(%s);", pid)
+        self.assertTrue(self.pool.get("select true as connected").connected)
+
+    def test_threads(self):
+        "can be shared between threads"
+        results = []
+
+        def worker():
+            for _ in range(10):
+                results.append(self.pool.get("select 1 as one").one)
+
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        self.pool.timeout = None
+        [t.start() for t in threads]
+        [t.join() for t in threads]
+        self.assertEqual(results, [1] * 40)
+        self.assertLessEqual(self.pool.size, 2)
+
+
+    def test_gather(self):
+        "runs independent queries concurrently, returning their rows in order"
+        pool = tornpsql.ConnectionPool(database="tornpsql", maxconn=4)
+        start = time.time()
+        results = pool.gather([("select pg_sleep(.2), %s as n", (n, )) for n in range(4)] +
+                              ["select 1 as one", ("select %(x)s as x", {'x': 2})])
+        self.assertLess(time.time() - start, .35)
+        self.assertEqual([rows[0].get('n') for rows in results[:4]], [0, 1, 2, 3])
+        self.assertEqual(results[4:], [[{'one': 1}], [{'x': 2}]])
+
+        start = time.time()
+        with self.assertRaises(tornpsql.ProgrammingError):
+            pool.gather(["select pg_sleep(5);", "select * from missing;"], max_workers=2)
+        with self.assertRaises(tornpsql.QueryCanceledError):
+            pool.gather(["select pg_sleep(5);", "select 1;"], timeout=.1)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual(pool.get("select count(*) from pg_stat_activity where query = 'select pg_sleep(5);' "
+                                  "and state = 'active';").count, 0)
+        self.assertEqual(pool.idle, pool.size)
+        pool.close()
+
+class TransactionalConnectionPoolTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(self):
+        self.pool = tornpsql.TransactionalConnectionPool(database="tornpsql", maxconn=1)
+
+    @classmethod
+    def tearDownClass(self):
+        self.pool.close()
+
+    def test_commit(self):
+        "commits when the block exits cleanly"
+        with self.pool.transaction() as db:
+            id = db.get("insert into other.users (name) values ('Pooled Customer 1') returning id;").id
+        self.assertEqual(self.pool.get('select name from other.users where id=%s', id).name, 'Pooled Customer 1')
+
+    def test_rollback(self):
+        "rolls back when the block raises"
+        try:
+            with self.pool.transaction() as db:
+                id = db.get("insert into other.users (name) values ('Pooled Customer 2') returning id;").id
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        self.assertIsNone(self.pool.get('select name from other.users where id=%s', id))
@@ -74,3 +74,138 @@ class tornpsqlTests(unittest.TestCase):
         self.db.execute("select pg_notify('example', 'Hello world!');")
         time.sleep(.1)
         self.assertEqual(len(self.db.query("SELECT * from notices")), 0)
+
+
+class PubSubDeliveryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = tornpsql.Connection(database="tornpsql")
+        self.pubsub = self.db.pubsub(timeout=.5)
+        self.pubsub.subscribe(('ordered', ))
+        self.publisher = tornpsql.Connection(database="tornpsql")
+
+    def tearDown(self):
+        self.db.close()
+        self.publisher.close()
+
+    def test_arrival_order(self):
+        "delivers notifications in arrival order"
+        notifies = iter(self.pubsub.listen())
+        self.publisher.execute("select pg_notify('ordered', x::text) from generate_series(1, 100) x;")
+        self.assertListEqual([next(notifies).payload for _ in range(100)], [str(x) for x in range(1, 101)])
+
+    def test_batches(self):
+        "can deliver the notifications received together as a list"
+        batches = self.pubsub.listen(batch=True)
+        self.publisher.execute("select pg_notify('ordered', x::text) from generate_series(1, 3) x;")
+        self.assertListEqual([n.payload for n in next(batches)], ['1', '2', '3'])
+
+    def test_pump(self):
+        "can put notifications in a bounded queue"
+        try:
+            from queue import Queue
+        except ImportError:  # pragma: no cover
+            from Queue import Queue
+        queue = Queue(2)
+        pump = threading.Thread(target=self.pubsub.pump, args=(queue, ))
+        pump.start()
+        time.sleep(.1)
+        self.publisher.execute("select pg_notify('ordered', x::text) from generate_series(1, 5) x;")
+        time.sleep(.1)
+        self.assertEqual(queue.qsize(), 2)
+        self.assertListEqual([queue.get(timeout=1).payload for _ in range(5)], ['1', '2', '3', '4', '5'])
+        self.pubsub.unsubscribe()
+        pump.join(1)
+        self.assertFalse(pump.is_alive())
+
+    def test_unsubscribe_wakes_listener(self):
+        "stops listening without a timeout once unsubscribed from another thread"
+        pubsub = self.db.pubsub()
+        pubsub.subscribe(('woken', ))
+        listener = threading.Thread(target=lambda: list(pubsub.listen()))
+        listener.start()
+        time.sleep(.1)
+        pubsub.unsubscribe()
+        listener.join(1)
+        self.assertFalse(listener.is_alive())
+
+
+class PublishTestCase(unittest.TestCase):
+    def setUp(self):
+        self.db = tornpsql.Connection(database="tornpsql")
+        self.pubsub = self.db.pubsub(timeout=.5)
+        self.pubsub.subscribe(['published', 'other'])
+        self.publisher_db = tornpsql.Connection(database="tornpsql")
+        self.publisher = self.publisher_db.pubsub()
+
+    def tearDown(self):
+        self.db.close()
+        self.publisher_db.close()
+
+    def test_publish_many(self):
+        "sends many notifications in one statement"
+        notifies = iter(self.pubsub.listen())
+        self.publisher.publish('other', 'first')
+        self.publisher.publish_many([('published', str(x)) for x in range(1000)] + [('other', None)])
+        self.assertEqual(next(notifies).payload, 'first')
+        self.assertListEqual([next(notifies).payload for _ in range(1000)], [str(x) for x in range(1000)])
+        self.assertEqual((lambda n: (n.channel, n.payload))(next(notifies)), ('other', ''))
+
+    def test_large_payloads(self):
+        "splits payloads over the size limit into chunks and joins them again"
+        large = u''.join(u'%d \u00e9\t' % x for x in range(10000))
+        notifies = iter(self.pubsub.listen())
+        self.publisher.publish_many([('published', large), ('other', 'small'), ('published', u'\x1fheader')])
+        self.publisher.publish('published', large, compress=True)
+        self.assertListEqual([next(notifies).payload for _ in range(4)], [large, 'small', u'\x1fheader', large])
+
+    def test_malformed_chunks(self):
+        "passes through payloads of other publishers that only look like chunks"
+        notifies = iter(self.pubsub.listen())
+        chunk = u'\x1f%s 0 1 b\x1f' % ('0' * 32)
+        payloads = [u'\x1f', u'\x1fa b\x1fc', chunk.replace(u' 0 1', u' 1 1'), chunk + u'!not base64!', u'\x1fheader']
+        self.publisher_db.execute("select pg_notify('published', p) from unnest(%s::text[]) p;", payloads)
+        self.publisher.publish('published', b'bytes')
+        self.assertListEqual([next(notifies).payload for _ in range(6)], payloads + ['bytes'])
+
+
+class PubSubHubTestCase(unittest.TestCase):
+    def setUp(self):
+        self.hub = tornpsql.PubSubHub(database="tornpsql", workers=2, timeout=.1)
+        self.db = tornpsql.Connection(database="tornpsql")
+
+    def tearDown(self):
+        self.hub.close()
+        self.db.close()
+
+    def backends(self):
+        return self.db.get("select count(*) from pg_stat_activity where datname = 'tornpsql';").count
+
+    def test_fan_out(self):
+        "delivers every notification to every subscriber over one connection"
+        try:
+            from queue import Queue
+        except ImportError:  # pragma: no cover
+            from Queue import Queue
+        backends = self.backends()
+        queues = [Queue() for _ in range(50)]
+        for queue in queues:
+            self.hub.subscribe(['hub'], queue.put)
+        self.assertEqual(self.backends(), backends)
+        self.db.execute("select pg_notify('hub', x::text) from generate_series(1, 3) x;")
+        for queue in queues:
+            self.assertListEqual([queue.get(timeout=1).payload for _ in range(3)], ['1', '2', '3'])
+
+    def test_reference_counting(self):
+        "listens until the last subscriber of a channel unsubscribes"
+        first, second = [], []
+        self.hub.subscribe(['hub', 'other'], first.append)
+        self.hub.subscribe(['hub'], second.append)
+        self.hub.unsubscribe(['hub'], first.append)
+        self.assertEqual(sorted(self.hub.channels), ['hub', 'other'])
+        self.db.execute("select pg_notify('hub', 'one');")
+        time.sleep(.2)
+        self.assertEqual(([n.payload for n in first], [n.payload for n in second]), ([], ['one']))
+        self.hub.unsubscribe(['hub'])
+        self.assertEqual(self.hub.channels, ['other'])
+        self.hub.unsubscribe()
+        self.assertEqual(self.hub.channels, [])
@@ -0,0 +1,62 @@
+import time
+import unittest
+
+import tornpsql
+
+
+PRIMARY = dict(database="tornpsql", search_path="public")
+REPLICA = dict(database="tornpsql", search_path="other")
+
+
+class LaggingRoutingConnection(tornpsql.RoutingConnection):
+    # the replica on the "other" search_path is 60 seconds behind
+    lag_query = lag_query_10 = "select case when current_setting('search_path') = 'other' then 60 else 0 end as lag;"
+
+
+class RoutingConnectionTestCase(unittest.TestCase):
+    def path(self, db):
+        return db.get("select current_setting('search_path') as path;").path
+
+    def test_routing(self):
+        "sends reads to the replicas and writes to the primary"
+        db = tornpsql.RoutingConnection(PRIMARY, [REPLICA, REPLICA], minconn=0, check_interval=None)
+        self.assertEqual(len(db.replicas), 2)
+        self.assertEqual(self.path(db), "other")
+        self.assertEqual([row.path for row in db.iter("select current_setting('search_path') as path;")], ["other"])
+        self.assertEqual(self.path(db.primary()), "public")
+        self.assertEqual(db.get("select current_setting('search_path') as path for update;").path, "public")
+        db.execute("create temp table routed (id int);")
+        self.assertEqual(db.query("insert into routed values (1) returning current_setting('search_path') as path;"),
+                         [{'path': 'public'}])
+        # round robin
+        self.assertIsNot(db.replica(), db.replica())
+        db.close()
+
+    def test_read_your_writes(self):
+        "reads from the primary for a while after writing"
+        db = tornpsql.RoutingConnection(PRIMARY, [REPLICA], minconn=0, sticky=.2, check_interval=None)
+        self.assertEqual(self.path(db), "other")
+        db.execute("select 1;")
+        self.assertEqual(self.path(db), "public")
+        time.sleep(.2)
+        self.assertEqual(self.path(db), "other")
+        db.close()
+
+    def test_lag(self):
+        "skips replicas lagging more than max_lag"
+        db = LaggingRoutingConnection(PRIMARY, [REPLICA, PRIMARY], minconn=0, max_lag=10, check_interval=.05)
+        self.assertEqual(len(db.replicas), 1)
+        self.assertEqual(self.path(db), "public")
+        db.max_lag = 100
+        time.sleep(.2)
+        self.assertEqual(len(db.replicas), 2)
+        db.close()
+
+    def test_least_latency(self):
+        "reads from the replica that answered its check fastest"
+        db = tornpsql.RoutingConnection(PRIMARY, [REPLICA, REPLICA], minconn=0, policy="least_latency",
+                                        check_interval=None)
+        fastest = min(db.replicas, key=db._latency.get)
+        self.assertIs(db.replica(), fastest)
+        self.assertIs(db.replica(), fastest)
+        db.close()
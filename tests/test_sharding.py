@@ -0,0 +1,60 @@
+import unittest
+
+import tornpsql
+
+
+class ShardedConnectionTestCase(unittest.TestCase):
+    def setUp(self):
+        # one connection per shard, so each keeps its own temp table
+        self.db = tornpsql.ShardedConnection([dict(database="tornpsql")] * 3, minconn=1, maxconn=1,
+                                             shard_map=tornpsql.RangeShardMap([100, 200]))
+        self.db.all_shards().execute("create temp table sharded (id int primary key, name text);")
+        for key in (1, 50, 150, 250, 299):
+            self.db.shard(key).execute("insert into sharded values (%s, %s);", key, 'name %s' % key)
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_routing(self):
+        "runs statements with a key on its shard"
+        self.assertEqual([pool.get("select count(*) from sharded;").count for pool in self.db.shards], [2, 1, 2])
+        self.assertEqual(self.db.shard(250).get("select name from sharded where id = %s;", 250).name, 'name 250')
+        self.assertIsNone(self.db.shard(50).get("select name from sharded where id = %s;", 250))
+
+    def test_scatter(self):
+        "runs statements without a key on every shard"
+        self.assertEqual(sorted(row.id for row in self.db.query("select id from sharded;")), [1, 50, 150, 250, 299])
+        self.assertEqual(self.db.get("select name from sharded where id = %(id)s;", id=150).name, 'name 150')
+        self.assertRaises(ValueError, self.db.get, "select 1 as one;")
+        self.assertEqual([row.id for row in self.db.iter("select id from sharded order by id;")], [1, 50, 150, 250, 299])
+        self.assertIsNone(self.db.query("update sharded set name = upper(name);"))
+        with self.assertRaises(tornpsql.ProgrammingError):
+            self.db.query("select * from missing;")
+
+    def test_writes_without_key(self):
+        "runs writes without a key on every shard only when asked to"
+        self.assertRaises(tornpsql.NotSupportedError, self.db.execute, "delete from sharded;")
+        self.assertRaises(tornpsql.NotSupportedError, self.db.executemany, "insert into sharded values (%s, 'x');", (7, ))
+        self.assertEqual(sum(row.count for row in self.db.query("select count(*) from sharded where id = 7;")), 0)
+        self.assertEqual(len(self.db.all_shards().executemany("insert into sharded values (%s, 'x') returning id;", (7, ))), 3)
+        self.assertEqual([pool.get("select count(*) from sharded where id = 7;").count for pool in self.db.shards], [1, 1, 1])
+
+    def test_merged(self):
+        "merges sorted results of the shards"
+        db = self.db.merged('id', limit=3, reverse=True)
+        self.assertEqual([row.id for row in db.query("select id from sharded order by id desc limit 3;")], [299, 250, 150])
+        self.assertEqual([row.id for row in db.iter("select id from sharded order by id desc;")], [299, 250, 150])
+        db = self.db.merged(['name', 'id'])
+        self.assertEqual([row.id for row in db.iter("select id, name from sharded order by name, id;")],
+                         [1, 150, 250, 299, 50])
+        db = self.db.merged(lambda row: row.id % 100)
+        self.assertEqual([row.id for row in db.query("select id from sharded order by id % 100;")],
+                         [1, 50, 150, 250, 299])
+        self.assertEqual([pool.idle for pool in self.db.shards], [1, 1, 1])
+
+    def test_shard_maps(self):
+        "maps keys to shards stably"
+        shards = tornpsql.HashShardMap(4)
+        self.assertEqual([shards(key) for key in (1, 'user-1', u'\xe9', b'user-1')], [3, 0, 2, 0])
+        ranges = tornpsql.RangeShardMap([10, 20])
+        self.assertEqual([ranges(key) for key in (-1, 9, 10, 19, 20, 1000)], [0, 0, 1, 1, 2, 2])
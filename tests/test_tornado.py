@@ -0,0 +1,88 @@
+import time
+import unittest
+
+import tornpsql
+
+try:
+    from tornado import gen
+    from tornado.testing import AsyncTestCase, gen_test
+except ImportError:  # pragma: no cover
+    AsyncTestCase, gen_test = unittest.TestCase, lambda f: f
+
+
+@unittest.skipUnless(hasattr(tornpsql, 'TornadoConnection'), 'tornado is not installed')
+class TornadoConnectionTestCase(AsyncTestCase):
+    def setUp(self):
+        super(TornadoConnectionTestCase, self).setUp()
+        self.db = tornpsql.TornadoConnection(database="tornpsql", ioloop=self.io_loop)
+
+    def tearDown(self):
+        self.db.close()
+        super(TornadoConnectionTestCase, self).tearDown()
+
+    @gen_test
+    def test_query(self):
+        "can query without blocking the IOLoop"
+        self.assertTrue((yield self.db.get("select true as connected")).connected)
+        rows = yield self.db.query("SELECT x from generate_series(1,10) x where x > %(g)s and x < %(l)s;", g=1, l=4)
+        self.assertListEqual(rows, [{'x': 2}, {'x': 3}])
+        self.assertIsNone((yield self.db.execute("select 1;")))
+
+    @gen_test
+    def test_queued_statements(self):
+        "queues statements sent while another is in flight"
+        rows = yield [self.db.get("select %s as n", n) for n in range(5)]
+        self.assertEqual([row.n for row in rows], list(range(5)))
+
+    @gen_test
+    def test_raises_exceptions(self):
+        "raises psycopg2 exceptions and stays usable"
+        with self.assertRaises(tornpsql.ProgrammingError):
+            yield self.db.query("st nothing from th;")
+        with self.assertRaises(ValueError):
+            yield self.db.get("select * from users")
+        self.assertTrue((yield self.db.get("select true as connected")).connected)
+
+    @gen_test
+    def test_reconnect(self):
+        "reconnects after the connection was lost"
+        yield self.db.connect()
+        self.db._db.close()
+        with self.assertRaises(tornpsql.InterfaceError):
+            yield self.db.query("select 1;")
+        self.assertTrue(self.db.closed)
+        self.assertTrue((yield self.db.get("select true as connected")).connected)
+
+    @gen_test
+    def test_search_path(self):
+        "sets the search_path when connecting"
+        db = tornpsql.TornadoConnection(database="tornpsql", search_path="other", ioloop=self.io_loop)
+        self.assertEqual((yield db.get("show search_path;")).search_path, "other")
+        db.close()
+
+    @gen_test
+    def test_listen(self):
+        "delivers notifications as IOLoop callbacks"
+        received = []
+        yield self.db.listen(['example'], received.append)
+        yield self.db.execute("select pg_notify('example', 'Hello world!');")
+        yield gen.sleep(.1)
+        self.assertEqual([(n.channel, n.payload) for n in received], [('example', 'Hello world!')])
+        yield self.db.unlisten(['example'])
+        yield self.db.execute("select pg_notify('example', 'Hello world!');")
+        yield gen.sleep(.1)
+        self.assertEqual(len(received), 1)
+
+
+@unittest.skipUnless(hasattr(tornpsql, 'TornadoConnection'), 'tornado is not installed')
+class TornadoConnectionPoolTestCase(AsyncTestCase):
+    @gen_test
+    def test_concurrent_queries(self):
+        "runs statements concurrently over several connections"
+        pool = tornpsql.TornadoConnectionPool(database="tornpsql", maxconn=10, ioloop=self.io_loop)
+        start = time.time()
+        rows = yield [pool.get("select pg_sleep(.2), %s as n", n) for n in range(20)]
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([row.n for row in rows], list(range(20)))
+        self.assertEqual(pool.size, 10)
+        pool.close()
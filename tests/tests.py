@@ -1,10 +1,16 @@
 import os
+import time
+import shutil
+import logging
+import tempfile
+import datetime
 import unittest
 import tornpsql
 from decimal import Decimal
 
 from psycopg2._json import Json
 from psycopg2.extras import HstoreAdapter
+from psycopg2.extensions import AsIs
 
 
 class ConnectionTestCase(unittest.TestCase):
@@ -20,6 +26,49 @@ class ConnectionTestCase(unittest.TestCase):
         self.db.file(os.path.join(os.path.dirname(__file__), "example.sql"))
         self.assertTrue(self.db.get("SELECT true as t from public.users where name='Mr. Johnson' limit 1;").t)
 
+    def test_split_statements(self):
+        "splits SQL at semicolons outside quotes and comments"
+        self.assertEqual(tornpsql.files.split("""-- first; not a statement
+            select 'a;''b', "c;d" from t; /* e; /* f; */ */
+            create function g() returns int as $body$ select 1; $body$ language sql;
+            select E'\\';' -- trailing
+            """), ["-- first; not a statement\n            select 'a;''b', \"c;d\" from t",
+                   "/* e; /* f; */ */\n            create function g() returns int as $body$ select 1; $body$ language sql",
+                   "select E'\\';' -- trailing"])
+        self.assertEqual(tornpsql.files.split("-- only a comment;\n"), [])
+        with open(os.path.join(os.path.dirname(__file__), "test.sql")) as r:
+            self.assertEqual(len(tornpsql.files.split(r.read())), 12)
+
+    def test_migrate(self):
+        "runs the files changed since the last migration, in one transaction"
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        db = tornpsql.Connection(database="tornpsql")
+        db.migrations_table = "pg_temp.migrations"
+        db.execute("create temp table migrated (name text);")
+
+        def write(name, sql):
+            path = os.path.join(directory, name)
+            with open(path, "w") as w:
+                w.write(sql)
+            # a new mtime even on coarse clocks
+            os.utime(path, (time.time(), time.time() + len(sql)))
+
+        write("1.sql", "insert into migrated values ('one');")
+        write("2.sql", "insert into migrated values ('two;');\n\\ir included.inc\n")
+        write("included.inc", "insert into migrated values ('three');")
+        paths = [os.path.join(directory, name) for name in ("1.sql", "2.sql")]
+        self.assertEqual(db.migrate(directory), paths)
+        self.assertEqual(db.migrate(directory), [])
+        write("included.inc", "insert into migrated values ('four');")
+        self.assertEqual(db.migrate(directory), paths[1:])
+        self.assertEqual([row.name for row in db.query("select name from migrated order by name;")],
+                         ["four", "one", "three", "two;", "two;"])
+
+        write("3.sql", "insert into migrated values ('five'); select * from missing;")
+        self.assertRaises(tornpsql.ProgrammingError, db.migrate, directory)
+        self.assertEqual(db.get("select count(*) from migrated;").count, 5)
+
     def test_connection_args(self):
         "test connect with args"
         db = tornpsql.Connection("127.0.0.1", "tornpsql", os.getenv("postgres", None))
@@ -62,6 +111,29 @@ class ConnectionTestCase(unittest.TestCase):
         self.db.executemany("insert into other.users (name) values (%s);", ["Mr. Smith"], ["Mr. Cramer"])
         self.assertEqual(self.db.get("select count(*) as t from other.users where name in ('Mr. Smith', 'Mr. Cramer');").t, 2)
 
+    def test_executemany_returning(self):
+        "returns the rows returned for every param sequence"
+        db = tornpsql.Connection(database="tornpsql", page_size=2)
+        names = ['Page %s' % i for i in range(5)]
+        rows = db.executemany("insert into other.users (name) values (%s) returning name, '100%%' as pct;", *[[n] for n in names])
+        self.assertListEqual([row.name for row in rows], names)
+        self.assertEqual(rows[0].pct, '100%')
+        rows = db.executemany("update other.users set name = name where name = %(name)s returning name;", *[dict(name=n) for n in names])
+        self.assertListEqual([row.name for row in rows], names)
+        self.assertIsNone(db.executemany("delete from other.users where name = %s;", *[[n] for n in names]))
+        self.assertEqual(db.get("select count(*) from other.users where name like 'Page %%';").count, 0)
+
+    def test_executemany_unfolded(self):
+        "runs inserts that cannot be folded into one statement one by one"
+        db = tornpsql.Connection(database="tornpsql", page_size=10)
+        db.executemany("insert into other.users (name) values (%s || ')');", ["Paren 1"], ["Paren 2"])
+        self.assertEqual(db.get("select count(*) from other.users where name in ('Paren 1)', 'Paren 2)');").count, 2)
+        db.executemany("insert into users (name, email) values (%s, 'upsert@example.com') "
+                       "on conflict (email) do update set name = excluded.name;", ["Upsert 1"], ["Upsert 2"])
+        self.assertEqual(db.get("select name from users where email = 'upsert@example.com';").name, "Upsert 2")
+        db.executemany("delete from users where email = %s -- by email", ["upsert@example.com"], ["none@example.com"])
+        self.assertIsNone(db.get("select name from users where email = 'upsert@example.com';"))
+
     def test_mogrify(self):
         "can mogrify w/ inline args"
         self.assertEqual(self.db.mogrify("select true from user where email=%s;", "joe@smoe.com"),
@@ -77,6 +149,43 @@ class ConnectionTestCase(unittest.TestCase):
         db = tornpsql.Connection()
         self.assertTrue(db.get("select true as connected").connected)
 
+    def test_retry(self):
+        "runs statements again on a new connection after losing it, when safe"
+        db = tornpsql.Connection(database="tornpsql", retry=tornpsql.RetryPolicy(attempts=3, backoff=.01))
+        other = tornpsql.Connection(database="tornpsql")
+
+        def kill():
+            db._ensure_connected()
+            other.execute("select pg_terminate_backend(%s);", db._db.get_backend_pid())
+
+        kill()
+        self.assertEqual(db.get("select 1 as one;").one, 1)
+        kill()
+        self.assertRaises(tornpsql.OperationalError, db.execute, "create temp table retried (id int);")
+        kill()
+        self.assertIsNone(db.idempotent().execute("create temp table if not exists retried (id int);"))
+        self.assertEqual(db.get("select count(*) from retried;").count, 0)
+        self.assertRaises(tornpsql.ProgrammingError, db.query, "select * from missing;")
+
+        db = tornpsql.Connection("127.0.0.1,127.0.0.1", "tornpsql", os.getenv("PGUSER"), target_session_attrs="read-write")
+        self.assertTrue(db.get("select true as connected;").connected)
+
+    def test_retry_policy(self):
+        "backs off exponentially within the attempts and deadline"
+        self.assertEqual(list(tornpsql.RetryPolicy(attempts=4, backoff=1, max_backoff=3, jitter=False).delays()), [1, 2, 3])
+        self.assertEqual(list(tornpsql.RetryPolicy(attempts=1).delays()), [])
+        self.assertEqual(list(tornpsql.RetryPolicy(attempts=9, backoff=1, jitter=False, deadline=4).delays()), [1, 2])
+        self.assertTrue(all(0 <= delay <= .1 * 2 ** i for i, delay in enumerate(tornpsql.RetryPolicy(attempts=5).delays())))
+
+    def test_search_path(self):
+        "sets the search_path when connecting, outside any transaction"
+        db = tornpsql.Connection(database="tornpsql", search_path="other")
+        self.assertTrue(db._db.autocommit)
+        self.assertEqual(db.get("show search_path;").search_path, "other")
+        db = tornpsql.TransactionalConnection(database="tornpsql", search_path="other")
+        db.rollback()
+        self.assertEqual(db.get("show search_path;").search_path, "other")
+
     def test_adapting(self):
         "can adapt data types outside query"
         self.assertEqual(self.db.adapt("this").getquoted(), b"'this'")
@@ -104,6 +213,310 @@ class ConnectionTestCase(unittest.TestCase):
         self.assertDictEqual(self.db.get("SELECT x from generate_series(1,10) x where x=%(id)s;", id=1), dict(x=1))
         self.assertListEqual(self.db.query("SELECT x from generate_series(1,10) x where x > %(g)s and x < %(l)s;", g=1, l=5), [{'x': 2}, {'x': 3}, {'x': 4}])
 
+    def test_kwargs_binding(self):
+        "binds keyword arguments like positional ones, so the statement can be prepared"
+        db = tornpsql.Connection(database="tornpsql", prepared_statements=2, prepare_threshold=2)
+        query = "SELECT x, %(x)s::int * %(y)s as z, '%%(x)s' as literal from generate_series(1,10) x where x = %(x)s;"
+        for x in range(1, 4):
+            self.assertEqual(db.get(query, y=10, x=x), dict(x=x, z=x * 10, literal='%(x)s'))
+        self.assertEqual(db.statements.hits, 1)
+        self.assertEqual(db.get("select count(*) from pg_prepared_statements;").count, 1)
+        self.assertEqual(db.mogrify("select %(a)s, %(b)s, %(a)s;", a="it's", b=None), b"select 'it''s', NULL, 'it''s';")
+        with self.assertRaises(KeyError):
+            db.get("select %(missing)s;", other=1)
+
+    def test_iter(self):
+        "can iterate over records through a server-side cursor"
+        db = tornpsql.Connection(database="tornpsql", itersize=2)
+        rows = db.iter("SELECT x from generate_series(1,5) x where x > %(g)s;", g=1)
+        self.assertDictEqual(next(rows), dict(x=2))
+        self.assertEqual(db.get("select count(*) from pg_cursors;").count, 1)
+        self.assertListEqual([row.x for row in rows], [3, 4, 5])
+        self.assertEqual(db.get("select count(*) from pg_cursors;").count, 0)
+
+    def test_iter_stop_early(self):
+        "closes the cursor when the consumer stops early"
+        for row in self.db.iter("select x from generate_series(1, 10000) x;"):
+            break
+        self.assertEqual(self.db.get("select count(*) from pg_cursors;").count, 0)
+
+    def test_iter_statements(self):
+        "can iterate over results of statements that cannot back a cursor"
+        self.assertEqual(len(list(self.db.iter("insert into other.users (name) values ('Iter') returning id;"))), 1)
+        self.assertListEqual(list(self.db.iter("set client_min_messages to NOTICE;")), [])
+        self.assertEqual(len(list(self.db.iter("select id from users where id < 3 for update;"))), 2)
+        self.assertEqual(len(list(self.db.iter("select id from users where id < 3 for share;"))), 2)
+        self.assertEqual(len(list(self.db.iter("with i as (insert into other.users (name) values ('Iter') returning id) select id from i;"))), 1)
+        self.assertListEqual(list(self.db.iter("select id into temp iter_ids from users where id < 3;")), [])
+        self.assertListEqual([row.x for row in self.db.iter("select 1 as x; select 2 as x;")], [2])
+
+    def test_compact_rows(self):
+        "can return compact rows per call or per connection"
+        rows = self.db.rows(tornpsql.CompactRow).query("SELECT x, x * 2 as y from generate_series(1,3) x;")
+        self.assertIsInstance(rows[0], tornpsql.CompactRow)
+        self.assertListEqual(rows, [{'x': 1, 'y': 2}, {'x': 2, 'y': 4}, {'x': 3, 'y': 6}])
+        self.assertEqual((rows[1].x, rows[1]['y']), (2, 4))
+        self.assertDictEqual(dict(rows[2]), {'x': 3, 'y': 6})
+        self.assertRaises(AttributeError, getattr, rows[0], 'z')
+        self.assertIsInstance(self.db.get("select 1 as x;"), tornpsql.Row)
+
+        # the row class applies to the next call only, whatever it does
+        self.db.rows(tornpsql.CompactRow).execute("select 1;")
+        self.assertIsInstance(self.db.get("select 1 as x;"), tornpsql.Row)
+        self.assertRaises(tornpsql.ProgrammingError, self.db.rows(tornpsql.CompactRow).query, "st nothing from th;")
+        self.assertIsInstance(self.db.get("select 1 as x;"), tornpsql.Row)
+        rows = self.db.rows(tornpsql.CompactRow).iter("select 1 as x;")
+        self.assertIsInstance(self.db.get("select 1 as x;"), tornpsql.Row)
+        self.assertIsInstance(next(rows), tornpsql.CompactRow)
+
+        db = tornpsql.Connection(database="tornpsql", row_class=tornpsql.CompactRow)
+        self.assertEqual([row.x for row in db.iter("SELECT x from generate_series(1,3) x;")], [1, 2, 3])
+        self.assertIsInstance(db.get("select 1 as x;"), tornpsql.CompactRow)
+
+    def test_query_columns(self):
+        "can return results as one list per column"
+        self.assertDictEqual(self.db.query_columns("SELECT x, x::text as t from generate_series(1,3) x where x > %s;", 1),
+                             {'x': [2, 3], 't': ['2', '3']})
+
+    def test_query_arrays(self):
+        "can return results as typed numpy arrays with nulls masked"
+        try:
+            import numpy
+        except ImportError:  # pragma: no cover
+            raise unittest.SkipTest('numpy is not installed')
+        columns = self.db.query_arrays("SELECT nullif(x, 2) as x, x / 2.0 as n, x > 1 as b, 'a' || x as t from generate_series(1,3) x;")
+        self.assertEqual(columns.x.dtype, numpy.int32)
+        self.assertListEqual(columns.x.tolist(), [1, None, 3])
+        self.assertEqual(columns.n.dtype, numpy.float64)
+        self.assertListEqual(columns.n.tolist(), [.5, 1, 1.5])
+        self.assertListEqual(columns.b.tolist(), [False, True, True])
+        self.assertListEqual(columns.t.tolist(), ['a1', 'a2', 'a3'])
+
+    def test_copy_in(self):
+        "can bulk load rows with copy in text format"
+        self.db.execute("create temp table copied (id int, name text, data json, tags text[], at timestamp);")
+        rows = ((i, 'tab\tnew\nline\\ %s' % i, dict(i=i), ['a "b"', None], None) for i in range(1000))
+        self.assertEqual(self.db.copy_in("copied", rows, chunk_size=1024), 1000)
+        row = self.db.get("select * from copied where id = 5;")
+        self.assertEqual(row.name, 'tab\tnew\nline\\ 5')
+        self.assertDictEqual(row.data, dict(i=5))
+        self.assertListEqual(row.tags, ['a "b"', None])
+        self.assertIsNone(row.at)
+        self.assertEqual(self.db.copy_in("copied", [dict(name='dict', id=-1)]), 1)
+        self.assertEqual(self.db.get("select id from copied where name = 'dict';").id, -1)
+        self.assertEqual(self.db.copy_in("copied", []), 0)
+        self.db.execute("drop table copied;")
+
+    def test_copy_in_binary(self):
+        "can bulk load rows with copy in binary format"
+        import datetime
+        self.db.execute("create temp table copied (id int8, name text, balance float8, ok bool, at timestamp, data jsonb);")
+        at = datetime.datetime(2017, 1, 2, 3, 4, 5, 6)
+        rows = [(1, 'one', 1.5, True, at, dict(a=1)), (2, None, None, False, None, None)]
+        self.assertEqual(self.db.copy_in("copied", rows, format='binary'), 2)
+        self.assertListEqual(self.db.query("select * from copied order by id;"),
+                             [dict(id=1, name='one', balance=1.5, ok=True, at=at, data=dict(a=1)),
+                              dict(id=2, name=None, balance=None, ok=False, at=None, data=None)])
+        self.assertRaises(tornpsql.NotSupportedError, self.db.copy_in, "users", [(Decimal(1), )], ['balance'], 'binary')
+        self.db.execute("drop table copied;")
+
+    def test_prepared_statements(self):
+        "can run frequent queries as prepared statements"
+        db = tornpsql.Connection(database="tornpsql", prepared_statements=2, prepare_threshold=2)
+        for x in range(1, 4):
+            self.assertEqual(db.get("SELECT x, '100%%' as pct from generate_series(1,10) x where x = %s;", x), dict(x=x, pct='100%'))
+        self.assertEqual(db.statements.hits, 1)
+        self.assertEqual(db.get("select count(*) from pg_prepared_statements;").count, 1)
+        for query in ("select 1 as one;", "select 2 as two;"):
+            db.get(query)
+            db.get(query)
+        self.assertEqual(len(db.statements), 2)
+        self.assertEqual(db.get("select count(*) from pg_prepared_statements;").count, 2)
+        db.execute("deallocate all;")
+        self.assertEqual(db.get("select 2 as two;").two, 2)
+        db.close()
+        self.assertEqual(db.get("select 1 as one;").one, 1)
+        self.assertEqual(len(db.statements), 0)
+
+    def test_prepared_escaped_percent(self):
+        "unescapes %% the same once prepared, with or without parameters"
+        db = tornpsql.Connection(database="tornpsql", prepared_statements=10, prepare_threshold=2)
+        db.execute("create temp table pct (value text);")
+        for _ in range(4):
+            db.execute("insert into pct values ('x%%');")
+        self.assertEqual(len(db.statements), 1)
+        self.assertEqual([row.value for row in db.query("select value from pct;")], ['x%'] * 4)
+
+    def test_unpreparable_statements(self):
+        "runs statements that cannot be prepared as is"
+        db = tornpsql.Connection(database="tornpsql", prepared_statements=10, prepare_threshold=1)
+        for _ in range(2):
+            db.execute("set client_min_messages to NOTICE;")
+            self.assertEqual(db.get("select 1 as one; select 2 as two;").two, 2)
+            self.assertEqual(db.get("select count(*) from users where id in %s;", (1, 2)).count, 2)
+            self.assertTrue(db.get("select %s is null as n;", None).n)
+            self.assertEqual(db.get("select %s as n;", AsIs('1')).n, 1)
+            self.assertEqual(db.get("select %s as n;", 1).n, 1)
+        self.assertEqual(len(db.statements), 0)
+
+        db = tornpsql.TransactionalConnection(database="tornpsql", prepared_statements=10, prepare_threshold=1)
+        self.assertTrue(db.get("select %s is null as n;", None).n)
+        self.assertEqual(db.get("select %s::int as n;", 1).n, 1)
+        self.assertEqual(len(db.statements), 1)
+        db.rollback()
+
+    def test_cached(self):
+        "can cache results until their ttl expires or their tags are invalidated"
+        db = tornpsql.Connection(database="tornpsql", cache_size=3)
+        db.execute("create temp table cached (id int, name text); insert into cached values (1, 'Before');")
+        query = "select name from cached where id = %s;"
+        self.assertEqual(db.cached(tags=['cached']).get(query, 1).name, 'Before')
+        db.execute("update cached set name = 'After';")
+        self.assertEqual(db.cached(tags=['cached']).get(query, 1).name, 'Before')
+        self.assertIsInstance(db.rows(tornpsql.CompactRow).cached(tags=['cached']).get(query, 1), tornpsql.CompactRow)
+        other = tornpsql.Connection(database="tornpsql")
+        other.invalidate(['cached'])
+        time.sleep(.05)
+        self.assertEqual(db.cached(tags=['cached']).get(query, 1).name, 'After')
+
+        self.assertEqual(db.cached(ttl=0).get("select %(x)s as x;", x=1).x, 1)
+        self.assertEqual(db.cached(ttl=0).get("select %(x)s as x;", x=1).x, 1)
+        for x in range(5):
+            db.cached().get("select %s as x;", x)
+        self.assertEqual(len(db.results), 3)
+        stats = db.results.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['invalidations']), (2, 9, 3, 1))
+        db.invalidate()
+        self.assertEqual(len(db.results), 0)
+
+    def test_cached_transactional(self):
+        "keeps listening for invalidations across rollbacks"
+        db = tornpsql.TransactionalConnection(database="tornpsql")
+        db.get("select 1 as one;")
+        self.assertRaises(tornpsql.ProgrammingError, db.cached)
+        db.rollback()
+        self.assertEqual(db.cached(tags=['t']).get("select 1 as one;").one, 1)
+        db.rollback()
+        tornpsql.Connection(database="tornpsql").invalidate(['t'])
+        time.sleep(.05)
+        self.assertEqual(db.cached(tags=['t']).get("select 1 as one;").one, 1)
+        self.assertEqual(db.results.stats()['invalidations'], 1)
+        db.rollback()
+
+    def test_stats(self):
+        "can time statements by normalized query and log the slow ones"
+        db = tornpsql.Connection(database="tornpsql", instrument=True, slow_query=.05)
+        self.assertIsInstance(db.instrument, tornpsql.QueryStats)
+        for x in range(20):
+            db.get("select %s as x, 'literal' as y;", x)
+        with self.assertRaises(tornpsql.ProgrammingError):
+            db.query("select * from missing where id = 1;")
+        slow = []
+        handler = logging.Handler()
+        handler.emit = slow.append
+        logging.getLogger().addHandler(handler)
+        try:
+            db.query("select pg_sleep(.06);")
+        finally:
+            logging.getLogger().removeHandler(handler)
+        db.executemany("select %s;", (1, ), (2, ))
+
+        stats = db.stats()
+        self.assertEqual(list(stats)[0], "select pg_sleep(?);")
+        self.assertTrue([r.getMessage() for r in slow if r.levelno == logging.WARNING][-1].endswith(
+            "): select pg_sleep(.06);"))
+        selects = stats["select %s as x, ? as y;"]
+        self.assertEqual((selects['calls'], selects['errors'], selects['rows']), (20, 0, 20))
+        self.assertTrue(0 < selects['p50'] <= selects['p95'] <= selects['p99'] <= selects['max'])
+        self.assertEqual(stats["select * from missing where id = ?;"]['errors'], 1)
+        self.assertEqual(stats["select %s;"]['calls'], 1)
+        self.assertEqual(tornpsql.Connection(database="tornpsql").stats(), {})
+
+    def test_explain(self):
+        "can capture the plans of slow read-only statements, once per interval"
+        db = tornpsql.Connection(database="tornpsql", explain_after=.02)
+        db.execute("create temp table explained (id int);")
+        for _ in range(2):
+            self.assertEqual(db.get("select x from pg_sleep(%s), (values (1)) v(x);", .03).x, 1)
+        db.query("insert into explained select 1 from pg_sleep(.03) returning id;")
+        db.get("select 1 as x;")
+        self.assertEqual(len(db.plans), 1)
+        plan = list(db.plans)[0]
+        self.assertEqual((plan['query'], plan['statement'], plan['parameters']),
+                         ("select x from pg_sleep(%s), (values (?)) v(x);",
+                          "select x from pg_sleep(0.03), (values (1)) v(x);", (.03, )))
+        self.assertIn('Shared Hit Blocks', plan['plan'][0]['Plan'])
+
+        db = tornpsql.Connection(database="tornpsql", explain_after=.02, explain_writes=True)
+        db.execute("create temp table explained (id int);")
+        db.query("insert into explained select 1 from pg_sleep(.03) returning id;")
+        self.assertEqual(len(db.plans), 1)
+        self.assertEqual(db.get("select count(*) from explained;").count, 1)
+
+    def test_explain_read_only(self):
+        "does not run the side effects of slow reads twice"
+        for db in (tornpsql.Connection(database="tornpsql", explain_after=0),
+                   tornpsql.TransactionalConnection(database="tornpsql", explain_after=0)):
+            # read-only transactions still advance temporary sequences
+            db.execute("drop sequence if exists explained_ids; create sequence explained_ids;")
+            self.assertEqual(db.get("select nextval('explained_ids') as id;").id, 1)
+            self.assertEqual(db.get("select currval('explained_ids') as id;").id, 1)
+            self.assertTrue(db.get("select pg_advisory_lock(4242) is not null as locked;").locked)
+            self.assertEqual(db.get("select count(*) from pg_locks where locktype = 'advisory' and pid = pg_backend_pid();").count, 1)
+            self.assertTrue(db.get("select pg_advisory_unlock(4242) as unlocked;").unlocked)
+            # reads without side effects are still explained
+            self.assertIn("select currval('explained_ids') as id;", [plan['statement'] for plan in db.plans])
+            db.execute("drop sequence explained_ids;")
+            if isinstance(db, tornpsql.TransactionalConnection):
+                db.commit()
+            db.close()
+
+    def test_batch(self):
+        "can run several queries in one round trip"
+        queries = ["select name, balance from users where id = 1;",
+                   ("SELECT x from generate_series(1,10) x where x > %s and x < %s", (1, 4)),
+                   ("select %(d)s::date as d, '{1,2}'::int[] as a, '{\"a\": 1}'::json as j, null as n;", dict(d='2017-01-02')),
+                   "select 1 as one where false;"]
+        expected = [[{'name': 'Elaina Dach', 'balance': Decimal('7.10')}],
+                    [{'x': 2}, {'x': 3}],
+                    [{'d': datetime.date(2017, 1, 2), 'a': [1, 2], 'j': {'a': 1}, 'n': None}],
+                    []]
+        self.assertListEqual(self.db.batch(queries), expected)
+        # columns are known now, so these are sent as one statement
+        self.assertListEqual(self.db.batch(queries), expected)
+
+    def test_batch_schema_changes(self):
+        "notices queries returning other columns than when last batched"
+        db = tornpsql.Connection(database="tornpsql")
+        db.execute("create temp table batched (a int); insert into batched values (1);")
+        queries = ["select * from batched;", "select 1 as one;"]
+        self.assertListEqual(db.batch(queries), [[{'a': 1}], [{'one': 1}]])
+        db.execute("alter table batched add column b text default 'x';")
+        self.assertListEqual(db.batch(queries), [[{'a': 1, 'b': 'x'}], [{'one': 1}]])
+        db.execute("alter table batched alter column a type text;")
+        self.assertListEqual(db.batch(queries), [[{'a': '1', 'b': 'x'}], [{'one': 1}]])
+        self.assertListEqual(db.batch(queries), [[{'a': '1', 'b': 'x'}], [{'one': 1}]])
+        db.execute("alter table batched rename column a to renamed;")
+        self.assertListEqual(db.batch(queries), [[{'renamed': '1', 'b': 'x'}], [{'one': 1}]])
+        self.assertListEqual(db.batch(queries), [[{'renamed': '1', 'b': 'x'}], [{'one': 1}]])
+        for _ in range(2):
+            self.assertListEqual(db.batch(["select 1 as x, 2 as x;", "select * from batched where false;"]), [[{'x': 2}], []])
+        db.close()
+
+    def test_batch_errors(self):
+        "reports errors of each query in a batch"
+        queries = ["select 1 as one;", "select 1 / 0 as boom;"]
+        self.assertRaises(tornpsql.DataError, self.db.batch, queries)
+        self.assertRaises(tornpsql.DataError, self.db.batch, ["select 1 as one;", "select 1 as one;", "select 1 / 0 as boom;"])
+        results = self.db.batch(queries, raise_errors=False)
+        self.assertListEqual(results[0], [{'one': 1}])
+        self.assertIsInstance(results[1], tornpsql.DataError)
+        queries = ["select 1 as one;", ("select 1 / %s as x;", (1, ))]
+        self.db.batch(queries)
+        results = self.db.batch([queries[0], ("select 1 / %s as x;", (0, ))], raise_errors=False)
+        self.assertListEqual(results[0], [{'one': 1}])
+        self.assertIsInstance(results[1], tornpsql.DataError)
+
     def test_notices(self):
         "can retreive notices"
         # clear other notices
@@ -128,6 +541,11 @@ class TransactionalConnectionTestCase(unittest.TestCase):
         self.db.commit()
         self.assertEqual(self.db.get('select name from other.users where id=%s', id).name, 'New Transactional Customer 1')
 
+    def test_iter(self):
+        "can iterate over records inside a transaction"
+        self.assertListEqual([row.x for row in self.db.iter("select x from generate_series(1, 3) x;")], [1, 2, 3])
+        self.db.rollback()
+
     def test_rollback(self):
         "can rollback a transaction"
         id = self.db.get("insert into other.users (name) values ('New Transactional Customer 2') returning id;").id
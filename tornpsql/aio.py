@@ -0,0 +1,313 @@
+"""asyncio support, built on psycopg2's asynchronous connections.
+
+http://initd.org/psycopg/docs/advanced.html#asynchronous-support
+"""
+import asyncio
+import logging
+from functools import partial
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+from psycopg2.extras import Json
+from psycopg2.extensions import POLL_OK, POLL_READ, POLL_WRITE
+
+from tornpsql import (Row, InterfaceError, OperationalError, PoolTimeout, _RE_WS, _HSTORE_OIDS,
+                      _logging_enabled, _connection_args, _session_statements, _positional)
+
+
+class AsyncConnection(object):
+    """A non-blocking connection driven by the asyncio event loop.
+
+    Takes the same arguments as `Connection`. The connection is opened by
+    `await db.connect()` or lazily by the first query. Connections are always
+    in autocommit mode and run one statement at a time; use an
+    `AsyncConnectionPool` to run queries concurrently.
+    """
+    def __init__(self, host_or_url=None, database=None, user=None, password=None, port=5432,
+                 search_path=None, timezone=None, enable_logging=None):
+        self._logging = _logging_enabled(enable_logging)
+        self._db_args, self._search_path, self._timezone = _connection_args(host_or_url, database, user, password,
+                                                                            port, search_path, timezone)
+        self.host = self._db_args['host']
+        self.database = self._db_args['database']
+        self._db = None
+        self._lock = None
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        """Closes this database connection."""
+        if getattr(self, '_db', None) is not None:
+            self._db.close()
+            self._db = None
+
+    @property
+    def closed(self):
+        return self._db is None or bool(self._db.closed)
+
+    async def connect(self):
+        """Opens the connection unless it is already open."""
+        if self.closed:
+            await self.reconnect()
+        return self
+
+    async def reconnect(self):
+        """Closes the existing database connection and re-opens it."""
+        self.close()
+        self._db = psycopg2.connect(async_=1, **self._db_args)
+        await self._wait()
+        await self._register_hstore()
+        for statement in _session_statements(self._search_path, self._timezone):
+            (await self._run(statement)).close()
+
+    async def _register_hstore(self):
+        """`register_hstore` looks up the oids with a blocking query, so look them up here and pass them in."""
+        cursor = self._db.cursor()
+        try:
+            cursor.execute(_HSTORE_OIDS)
+            await self._wait()
+            oids = cursor.fetchone()
+        finally:
+            cursor.close()
+        if oids:
+            psycopg2.extras.register_hstore(None, globally=True, oid=oids[0], array_oid=oids[1])
+        psycopg2.extensions.register_adapter(dict, Json)
+
+    def _ready(self, add, remove):
+        """Returns a future resolved once the connection socket is readable/writable."""
+        fd = self._db.fileno()
+        future = asyncio.get_event_loop().create_future()
+
+        def callback():
+            remove(fd)
+            if not future.done():
+                future.set_result(None)
+
+        add(fd, callback)
+        future.add_done_callback(lambda _: remove(fd))
+        return future
+
+    async def _wait(self):
+        """Polls the connection until the pending operation is complete."""
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                state = self._db.poll()
+                if state == POLL_OK:
+                    return
+                elif state == POLL_READ:
+                    await self._ready(loop.add_reader, loop.remove_reader)
+                elif state == POLL_WRITE:
+                    await self._ready(loop.add_writer, loop.remove_writer)
+                else:  # pragma: no cover
+                    raise OperationalError('Bad result from poll: %r' % state)
+        except (asyncio.CancelledError, OperationalError):
+            # the connection is left mid-statement, start afresh next time
+            self.close()
+            raise
+
+    async def _run(self, query, parameters=None, kwargs=None):
+        """Executes a statement, returning the cursor with its results."""
+        if kwargs:
+            query, parameters = _positional(query, kwargs)
+        if self._logging:
+            logging.info(_RE_WS.sub(' ', query))
+        cursor = self._db.cursor()
+        try:
+            cursor.execute(query, parameters or None)
+            await self._wait()
+        except OperationalError as e:  # pragma: no cover
+            logging.error("Error connecting to PostgreSQL on %s, %s", self.host, e)
+            raise
+        except:
+            cursor.close()
+            raise
+        return cursor
+
+    async def _cursor(self, query, parameters, kwargs):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self.closed:
+                await self.reconnect()
+            return await self._run(query, parameters, kwargs)
+
+    def mogrify(self, query, *parameters, **kwargs):
+        """Return a query string after arguments binding, see `Connection.mogrify`.
+        Needs an open connection, as the encoding depends on the server.
+        """
+        if self.closed:
+            raise InterfaceError('connection is not open, await connect() first')
+        cursor = self._db.cursor()
+        try:
+            if kwargs:
+                query, parameters = _positional(query, kwargs)
+            return cursor.mogrify(query, parameters)
+        finally:
+            cursor.close()
+
+    async def query(self, query, *parameters, **kwargs):
+        """Returns a row list for the given query and parameters."""
+        cursor = await self._cursor(query, parameters, kwargs)
+        try:
+            if cursor.description:
+                column_names = [column.name for column in cursor.description]
+                return [Row(zip(column_names, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+    async def get(self, query, *parameters, **kwargs):
+        """Returns the first row returned for the given query."""
+        rows = await self.query(query, *parameters, **kwargs)
+        if not rows:
+            return None
+        elif len(rows) > 1:
+            raise ValueError('Multiple rows returned for get() query')
+        else:
+            return rows[0]
+
+    async def execute(self, query, *parameters, **kwargs):
+        """Same as query, but do not process results. Always returns `None`."""
+        cursor = await self._cursor(query, parameters, kwargs)
+        cursor.close()
+
+    async def iter(self, query, *parameters, **kwargs):
+        """Returns an async generator for records from the query.
+
+        psycopg2 cannot use server-side cursors asynchronously, so the
+        whole result is received before the first row is yielded.
+        """
+        cursor = await self._cursor(query, parameters, kwargs)
+        try:
+            if cursor.description:
+                column_names = [column.name for column in cursor.description]
+                for record in cursor:
+                    yield Row(zip(column_names, record))
+        finally:
+            cursor.close()
+
+
+async def alisten(pubsub, batch=False):
+    """The async generator behind `PubSub.alisten`, woken up by the event loop when the connection is readable."""
+    loop = asyncio.get_event_loop()
+    ready = asyncio.Event()
+    fd = pubsub._db.fileno()
+    loop.add_reader(fd, ready.set)
+    pubsub._wake = partial(loop.call_soon_threadsafe, ready.set)
+    try:
+        while pubsub.channels:
+            notifies = pubsub._poll(0)
+            if not notifies:
+                ready.clear()
+                await ready.wait()
+            elif batch:
+                yield notifies
+            else:
+                for notify in notifies:
+                    yield notify
+    finally:
+        pubsub._wake = None
+        loop.remove_reader(fd)
+        pubsub.close()
+        if not pubsub._db.closed:
+            pubsub.unsubscribe()
+
+
+class _Checkout(object):
+    """Async context manager returned by `AsyncConnectionPool.connection()`."""
+    def __init__(self, pool, timeout):
+        self._pool = pool
+        self._timeout = timeout
+        self._conn = None
+
+    async def __aenter__(self):
+        self._conn = await self._pool.acquire(self._timeout)
+        return self._conn
+
+    async def __aexit__(self, *exc_info):
+        self._pool.release(self._conn)
+
+
+class AsyncConnectionPool(object):
+    """A pool of `AsyncConnection` objects shared by the tasks of one event loop.
+
+    Takes the same arguments as `AsyncConnection`, plus `maxconn`, the upper
+    bound on open connections, and `timeout`, the seconds `acquire()` waits
+    for a free connection before raising `PoolTimeout`.
+    """
+    connection_class = AsyncConnection
+
+    def __init__(self, *args, **kwargs):
+        self.maxconn = kwargs.pop('maxconn', 10)
+        self.timeout = kwargs.pop('timeout', None)
+        assert self.maxconn > 0, 'Invalid pool size. Must be maxconn > 0'
+        self._args = args
+        self._kwargs = kwargs
+        self._queue = None
+
+    def _slots(self):
+        if self._queue is None:
+            # a slot is either an idle connection or None, the room to open one
+            self._queue = asyncio.Queue()
+            for _ in range(self.maxconn):
+                self._queue.put_nowait(None)
+        return self._queue
+
+    async def acquire(self, timeout=None):
+        """Checks out a connection, waiting up to `timeout` seconds for one to be released."""
+        if timeout is None:
+            timeout = self.timeout
+        try:
+            conn = await asyncio.wait_for(self._slots().get(), timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout('No connection available after %ss' % timeout)
+        try:
+            if conn is None:
+                conn = self.connection_class(*self._args, **self._kwargs)
+            return await conn.connect()
+        except BaseException:
+            self._queue.put_nowait(None)
+            raise
+
+    def release(self, conn):
+        """Returns a connection to the pool."""
+        if self._queue is None:
+            # the pool was closed while the connection was checked out
+            conn.close()
+        else:
+            self._queue.put_nowait(None if conn.closed else conn)
+
+    def connection(self, timeout=None):
+        """`async with pool.connection() as db:` checks out a connection for the block."""
+        return _Checkout(self, timeout)
+
+    def close(self):
+        """Closes all idle connections."""
+        while self._queue is not None and not self._queue.empty():
+            conn = self._queue.get_nowait()
+            if conn is not None:
+                conn.close()
+        self._queue = None
+
+    async def query(self, query, *parameters, **kwargs):
+        """Returns a row list for the given query and parameters."""
+        async with self.connection() as db:
+            return await db.query(query, *parameters, **kwargs)
+
+    async def get(self, query, *parameters, **kwargs):
+        """Returns the first row returned for the given query."""
+        async with self.connection() as db:
+            return await db.get(query, *parameters, **kwargs)
+
+    async def execute(self, query, *parameters, **kwargs):
+        """Same as query, but do not process results. Always returns `None`."""
+        async with self.connection() as db:
+            return await db.execute(query, *parameters, **kwargs)
+
+    async def iter(self, query, *parameters, **kwargs):
+        """Returns an async generator for records from the query."""
+        async with self.connection() as db:
+            async for row in db.iter(query, *parameters, **kwargs):
+                yield row
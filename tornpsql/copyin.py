@@ -0,0 +1,142 @@
+"""Encoding of rows for `COPY ... FROM STDIN`, in text or binary format.
+
+https://www.postgresql.org/docs/current/static/sql-copy.html#id-1.9.3.55.9
+"""
+import json
+import uuid
+import struct
+import datetime
+
+from psycopg2.extras import Json
+from psycopg2.extras import HstoreAdapter
+
+try:
+    unicode
+except NameError:
+    unicode = str
+
+
+_TEXT_ESCAPES = {ord('\\'): u'\\\\', ord('\n'): u'\\n', ord('\r'): u'\\r', ord('\t'): u'\\t'}
+_BINARY_TYPES = (bytearray, memoryview) if bytes is str else (bytes, bytearray, memoryview)
+
+_BINARY_HEADER = b'PGCOPY\n\xff\r\n\x00' + struct.pack('!ii', 0, 0)
+_BINARY_TRAILER = struct.pack('!h', -1)
+_NULL = struct.pack('!i', -1)
+_EPOCH = datetime.datetime(2000, 1, 1)
+_EPOCH_DATE = _EPOCH.date()
+
+
+def _quote(element):
+    return u'"%s"' % element.replace(u'\\', u'\\\\').replace(u'"', u'\\"')
+
+
+def _array(values):
+    return u'{%s}' % u','.join(u'NULL' if v is None else _array(v) if isinstance(v, (list, tuple)) else _quote(text(v))
+                               for v in values)
+
+
+def _hstore(values):
+    return u', '.join(u'%s=>%s' % (_quote(unicode(k)), u'NULL' if v is None else _quote(unicode(v)))
+                      for k, v in values.items())
+
+
+def text(value):
+    """Returns the text representation of a value, adapting dicts, Json and hstore the way queries do."""
+    if isinstance(value, bool):
+        return u't' if value else u'f'
+    elif isinstance(value, Json):
+        return value.dumps(value.adapted)
+    elif isinstance(value, HstoreAdapter):
+        return _hstore(value.wrapped)
+    elif isinstance(value, dict):
+        return json.dumps(value)
+    elif isinstance(value, (list, tuple)):
+        return _array(value)
+    elif isinstance(value, _BINARY_TYPES):
+        return u'\\x' + bytes(value).hex() if hasattr(bytes, 'hex') else u'\\x' + bytes(value).encode('hex')
+    elif isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    elif isinstance(value, bytes):
+        return value.decode('utf-8')
+    return unicode(value)
+
+
+def text_rows(rows, encoding):
+    """Yields each row as a line of tab separated, escaped values."""
+    for row in rows:
+        yield (u'\t'.join(u'\\N' if value is None else text(value).translate(_TEXT_ESCAPES)
+                          for value in row) + u'\n').encode(encoding)
+
+
+def _micros(delta):
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _utc(value):
+    offset = value.utcoffset()
+    return value.replace(tzinfo=None) - offset if offset is not None else value
+
+
+def binary_encoders(encoding):
+    """Returns the functions encoding a value in binary format, by type name."""
+    def encode_text(value):
+        return text(value).encode(encoding)
+
+    return {
+        'bool': lambda v: b'\x01' if v else b'\x00',
+        'int2': struct.Struct('!h').pack,
+        'int4': struct.Struct('!i').pack,
+        'int8': struct.Struct('!q').pack,
+        'oid': struct.Struct('!I').pack,
+        'float4': struct.Struct('!f').pack,
+        'float8': struct.Struct('!d').pack,
+        'text': encode_text,
+        'varchar': encode_text,
+        'bpchar': encode_text,
+        'name': encode_text,
+        'json': encode_text,
+        'jsonb': lambda v: b'\x01' + encode_text(v),
+        'bytea': bytes,
+        'uuid': lambda v: (v if isinstance(v, uuid.UUID) else uuid.UUID(v)).bytes,
+        'date': lambda v: struct.pack('!i', (v - _EPOCH_DATE).days),
+        'timestamp': lambda v: struct.pack('!q', _micros(v - _EPOCH)),
+        'timestamptz': lambda v: struct.pack('!q', _micros(_utc(v) - _EPOCH)),
+    }
+
+
+def binary_rows(rows, encoders):
+    """Yields the binary header, each row as a tuple of length prefixed fields, then the trailer."""
+    yield _BINARY_HEADER
+    count = struct.Struct('!h').pack(len(encoders))
+    length = struct.Struct('!i').pack
+    for row in rows:
+        fields = [count]
+        for encode, value in zip(encoders, row):
+            if value is None:
+                fields.append(_NULL)
+            else:
+                data = encode(value)
+                fields.append(length(len(data)))
+                fields.append(data)
+        yield b''.join(fields)
+    yield _BINARY_TRAILER
+
+
+class Reader(object):
+    """A file-like object psycopg2 reads encoded rows from, pulling rows from the source only as needed."""
+    def __init__(self, chunks):
+        self._chunks = chunks
+        self._rest = b''
+
+    def read(self, size=-1):
+        data, length = [self._rest], len(self._rest)
+        for chunk in self._chunks:
+            data.append(chunk)
+            length += len(chunk)
+            if 0 <= size <= length:
+                break
+        data = b''.join(data)
+        if size < 0:
+            size = len(data)
+        self._rest = data[size:]
+        return data[:size]
@@ -0,0 +1,144 @@
+"""Reading SQL files: psql `\\ir` includes, splitting into statements, and caching by modification time."""
+import io
+import os
+import re
+import hashlib
+import threading
+
+# \ir on a line of its own, relative to the including file as in psql
+_RE_INCLUDE = re.compile(r'^[ \t]*\\ir[ \t]+(.+?)[ \t]*$', re.M)
+# where a quote, comment or statement end may start
+_RE_SPECIAL = re.compile(r"""[;'"]|--|/\*|\$(?:[A-Za-z_][A-Za-z0-9_]*)?\$""")
+_RE_ESCAPE_STRING = re.compile(r"[eE]'$")
+# block comments nest
+_RE_COMMENT = re.compile(r'/\*|\*/')
+
+
+def split(sql):
+    """Returns the statements of the SQL text, without their trailing semicolons.
+
+    Semicolons inside quoted strings, quoted identifiers, dollar quoted bodies and comments
+    do not end a statement. Statements made of comments only are dropped.
+    """
+    statements = []
+    start = position = 0
+    code = False
+    while True:
+        match = _RE_SPECIAL.search(sql, position)
+        if match is None:
+            break
+        token = match.group()
+        if not code and sql[position:match.start()].strip():
+            code = True
+        if token == ';':
+            if code:
+                statements.append(sql[start:match.start()].strip())
+            start = position = match.end()
+            code = False
+        elif token == '--':
+            end = sql.find('\n', match.end())
+            position = len(sql) if end == -1 else end
+        elif token == '/*':
+            position = _comment_end(sql, match.end())
+        elif token in ("'", '"'):
+            code = True
+            backslashes = token == "'" and bool(_RE_ESCAPE_STRING.search(sql, 0, match.end()))
+            position = _quote_end(sql, match.end(), token, backslashes)
+        else:
+            code = True
+            end = sql.find(token, match.end())
+            position = len(sql) if end == -1 else end + len(token)
+    if code or sql[position:].strip():
+        statements.append(sql[start:].strip())
+    return statements
+
+
+def _comment_end(sql, position):
+    depth = 1
+    while depth:
+        match = _RE_COMMENT.search(sql, position)
+        if match is None:
+            return len(sql)
+        depth += 1 if match.group() == '/*' else -1
+        position = match.end()
+    return position
+
+
+def _quote_end(sql, position, quote, backslashes):
+    while True:
+        end = sql.find(quote, position)
+        if end == -1:
+            return len(sql)
+        if backslashes:
+            escapes = len(sql[position:end]) - len(sql[position:end].rstrip('\\'))
+            if escapes % 2:
+                position = end + 1
+                continue
+        if sql.startswith(quote, end + 1):
+            # a doubled quote stands for itself
+            position = end + 2
+            continue
+        return end + 1
+
+
+class SqlFile(object):
+    """A file with its includes resolved: its `text`, `statements` and `checksum` (SHA-256 of the text)."""
+    def __init__(self, path, text, dependencies):
+        self.path = path
+        self.text = text
+        self.statements = split(text)
+        self.checksum = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        # (path, mtime, size) of the file and every file it includes
+        self.dependencies = dependencies
+
+    def changed(self):
+        """Whether the file or one of its includes changed since they were read."""
+        try:
+            return any(_stamp(path) != stamp for path, stamp in self.dependencies)
+        except OSError:
+            return True
+
+
+def _stamp(path):
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+def _read(path, dependencies, including):
+    path = os.path.abspath(path)
+    if path in including:
+        raise ValueError('SQL file %s includes itself through %s' % (path, ' -> '.join(including)))
+    dependencies.append((path, _stamp(path)))
+    with io.open(path, encoding='utf-8') as r:
+        text = r.read()
+    base = os.path.dirname(path)
+    return _RE_INCLUDE.sub(lambda m: _read(os.path.join(base, m.group(1)), dependencies, including + [path]), text)
+
+
+def expand(paths):
+    """Returns the paths with each directory replaced by the `.sql` files in it, in name order."""
+    expanded = []
+    for path in paths:
+        if os.path.isdir(path):
+            expanded.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.sql'))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+# SqlFile by absolute path, reread once they or their includes change
+_files = {}
+_files_lock = threading.Lock()
+
+
+def load(path):
+    """Returns the SqlFile of the path, read again only when it or one of its includes changed."""
+    key = os.path.abspath(path)
+    with _files_lock:
+        sql_file = _files.get(key)
+    if sql_file is None or sql_file.changed():
+        dependencies = []
+        sql_file = SqlFile(key, _read(key, dependencies, []), dependencies)
+        with _files_lock:
+            _files[key] = sql_file
+    return sql_file
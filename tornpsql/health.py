@@ -0,0 +1,87 @@
+import time
+import logging
+import weakref
+import threading
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from tornpsql import Error
+from tornpsql.retry import connection_lost
+
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+class HealthMonitor(object):
+    """Pings the connections it watches once they have been idle for their `health_check` seconds.
+    Those whose ping finds the connection lost are marked unhealthy, and reconnect in their own
+    thread before their next statement, instead of failing it.
+
+    Each connection keeps `healthy` and `ping_latency`, the seconds of its last ping. Only autocommit
+    connections outside a transaction are pinged, as the transactions of the others are their owners'
+    to end, and connections no longer referenced elsewhere are forgotten. `resolution` is the seconds
+    between looks at the idle times.
+    """
+    def __init__(self, resolution=1):
+        self.resolution = resolution
+        self._connections = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self._connections)
+
+    def watch(self, conn):
+        with self._lock:
+            self._connections.add(conn)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unwatch(self, conn):
+        with self._lock:
+            self._connections.discard(conn)
+
+    def _run(self):
+        while not self._closed.wait(self.resolution):
+            self.check()
+
+    def check(self):
+        """Pings the connections idle for their `health_check` seconds or more."""
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            db = conn._db
+            if db is None or conn.health_check is None or _now() - conn._last_used < conn.health_check:
+                continue
+            # the owner may start using the connection at any time, so the ping must never end a transaction
+            if not db.autocommit or (not db.closed and db.get_transaction_status() != TRANSACTION_STATUS_IDLE):
+                continue
+            try:
+                conn.ping()
+            except Error as e:
+                # other errors belong to a statement the owner started meanwhile
+                if connection_lost(e):
+                    conn.healthy = False
+                    logging.warning('Idle connection to PostgreSQL on %s failed its ping, reconnecting on next use, %s',
+                                    conn.host, e)
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+_monitor = None
+_monitor_lock = threading.Lock()
+
+
+def monitor():
+    """Returns the process-wide HealthMonitor connections with a `health_check` register with."""
+    global _monitor
+    with _monitor_lock:
+        if _monitor is None:
+            _monitor = HealthMonitor()
+        return _monitor
@@ -0,0 +1,130 @@
+import time
+import logging
+import threading
+
+try:
+    from queue import Queue
+except ImportError:  # pragma: no cover
+    from Queue import Queue
+
+from tornpsql import Connection, Error
+
+
+class PubSubHub(object):
+    """Shares one LISTEN connection between any number of in-process subscribers.
+
+    Takes the same arguments as `Connection`, plus `workers`, the number of
+    threads calling the callbacks, and `timeout`, the seconds the listener
+    waits before checking whether the hub was closed.
+
+    A channel is listened to when its first callback subscribes and
+    unlistened when its last one unsubscribes. A callback is always called
+    from the same worker, so it sees the notifications in arrival order.
+    Subscribe `queue.put` to deliver notifications to a per-subscriber queue.
+    """
+    connection_class = Connection
+
+    def __init__(self, *args, **kwargs):
+        self.workers = kwargs.pop('workers', 4)
+        self.timeout = kwargs.pop('timeout', 1)
+        assert self.workers > 0, 'Invalid number of workers. Must be workers > 0'
+        self._db = self.connection_class(*args, **kwargs)
+        self._pubsub = self._db.pubsub(self.timeout)
+        self._lock = threading.Lock()
+        # callbacks by channel
+        self._callbacks = {}
+        self._tasks = [Queue() for _ in range(self.workers)]
+        self._threads = []
+        self._closed = False
+
+    @property
+    def channels(self):
+        return list(self._callbacks)
+
+    def _start(self):
+        """Starts the listener and worker threads. Must be called holding the lock."""
+        self._threads = [threading.Thread(target=self._work, args=(tasks, )) for tasks in self._tasks]
+        self._threads.append(threading.Thread(target=self._listen))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def subscribe(self, channels, callback):
+        """Calls `callback(notify)` from a worker thread for every notification on `channels`."""
+        assert type(channels) in (tuple, list), 'Invalid channels. Must be tuple or list of strings'
+        with self._lock:
+            assert not self._closed, 'Hub is closed.'
+            self._pubsub.subscribe([c for c in channels if c not in self._callbacks])
+            for channel in channels:
+                self._callbacks[channel] = self._callbacks.get(channel, []) + [callback]
+            if not self._threads:
+                self._start()
+
+    def unsubscribe(self, channels=None, callback=None):
+        """Stops calling `callback` (all callbacks by default) for `channels` (all by default)."""
+        with self._lock:
+            channels = list(self._callbacks) if channels is None else channels
+            assert type(channels) in (tuple, list), 'Invalid channels. Must be tuple or list of strings'
+            removed = []
+            for channel in channels:
+                callbacks = [c for c in self._callbacks.get(channel, []) if callback is not None and c != callback]
+                if callbacks:
+                    self._callbacks[channel] = callbacks
+                elif self._callbacks.pop(channel, None) is not None:
+                    removed.append(channel)
+            if removed:
+                self._pubsub.unsubscribe(removed)
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                batch = self._pubsub._poll(self.timeout)
+            except Error as e:
+                if self._closed:
+                    break
+                logging.error("Error listening on PostgreSQL on %s, %s", self._db.host, e)
+                self._reconnect()
+                continue
+            with self._lock:
+                callbacks = self._callbacks
+                for notify in batch:
+                    for callback in callbacks.get(notify.channel, ()):
+                        self._tasks[hash(callback) % self.workers].put((callback, notify))
+
+    def _reconnect(self):
+        """Opens a new listening connection, listening to the subscribed channels again."""
+        try:
+            with self._lock:
+                self._pubsub.close()
+                self._db.reconnect()
+                self._pubsub = self._db.pubsub(self.timeout)
+                self._pubsub.subscribe(list(self._callbacks))
+        except Error as e:
+            logging.error("Error connecting to PostgreSQL on %s, %s", self._db.host, e)
+            time.sleep(self.timeout)
+
+    def _work(self, tasks):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            callback, notify = task
+            try:
+                callback(notify)
+            except Exception:
+                logging.exception('Error in notification callback %r', callback)
+
+    def close(self):
+        """Stops listening, lets the workers finish the notifications received and closes the connection."""
+        with self._lock:
+            self._closed = True
+            threads, self._threads = self._threads, []
+        if threads:
+            # the listener first, so no notification is handed to a stopped worker
+            threads.pop().join()
+        for tasks in self._tasks:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+        self._pubsub.close()
+        self._db.close()
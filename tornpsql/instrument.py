@@ -0,0 +1,139 @@
+"""Per-statement latency histograms and counters, and plans of slow statements, fed by the connection."""
+import re
+import math
+import time
+import random
+from collections import OrderedDict, deque
+
+# string and number literals, folded so statements that differ only by them count as one
+_RE_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w$.])(?:\d+(?:\.\d*)?|\.\d+)(?:e[+-]?\d+)?(?!\w)", re.I)
+_RE_WS = re.compile(r'\s+')
+# four buckets per doubling, from a microsecond: percentiles are within 19% of the exact latency
+_BUCKETS_PER_DOUBLING = 4
+_FIRST_BUCKET = 1e-6
+
+
+def normalize(query):
+    """Returns the statement with its literals replaced by `?` and whitespace collapsed."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return _RE_WS.sub(' ', _RE_LITERAL.sub('?', query)).strip()
+
+
+def _bucket(seconds):
+    if seconds <= _FIRST_BUCKET:
+        return 0
+    return int(math.log(seconds / _FIRST_BUCKET, 2) * _BUCKETS_PER_DOUBLING) + 1
+
+
+def _upper_bound(bucket):
+    return _FIRST_BUCKET * 2 ** (float(bucket) / _BUCKETS_PER_DOUBLING)
+
+
+class QueryStats(object):
+    """Counts calls, errors, rows and bytes sent, and keeps a latency histogram, per normalized statement.
+
+    Called with `(query, seconds, rows, size, error)` after every statement. At most `size`
+    statements are tracked; the least recently run one is dropped past that.
+    """
+    def __init__(self, size=1000):
+        self.size = size
+        # normalized statement: [calls, errors, rows, bytes, seconds, max seconds, {bucket: count}]
+        self._stats = OrderedDict()
+        # statement as sent: normalized statement, so the literals are folded once per statement
+        self._normalized = OrderedDict()
+
+    def __len__(self):
+        return len(self._stats)
+
+    def clear(self):
+        self._stats.clear()
+        self._normalized.clear()
+
+    def __call__(self, query, seconds, rows, size, error):
+        key = self._normalized.pop(query, None)
+        if key is None:
+            key = normalize(query)
+            if len(self._normalized) >= self.size:
+                self._normalized.popitem(last=False)
+        self._normalized[query] = key
+
+        stats = self._stats.pop(key, None)
+        if stats is None:
+            stats = [0, 0, 0, 0, 0.0, 0.0, {}]
+            if len(self._stats) >= self.size:
+                self._stats.popitem(last=False)
+        self._stats[key] = stats
+        stats[0] += 1
+        if error is not None:
+            stats[1] += 1
+        if rows > 0:
+            stats[2] += rows
+        stats[3] += size
+        stats[4] += seconds
+        stats[5] = max(stats[5], seconds)
+        bucket = _bucket(seconds)
+        stats[6][bucket] = stats[6].get(bucket, 0) + 1
+
+    @staticmethod
+    def _percentile(buckets, calls, longest, fraction):
+        rank = fraction * calls
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= rank:
+                return min(_upper_bound(bucket), longest)
+        return longest
+
+    def stats(self):
+        """Returns the counters and p50/p95/p99 latencies in seconds of each statement, slowest in total first."""
+        result = OrderedDict()
+        for key, (calls, errors, rows, size, total, longest, buckets) in sorted(
+                self._stats.items(), key=lambda item: -item[1][4]):
+            result[key] = dict(calls=calls, errors=errors, rows=rows, bytes=size, total=total,
+                               mean=total / calls, max=longest,
+                               p50=self._percentile(buckets, calls, longest, .5),
+                               p95=self._percentile(buckets, calls, longest, .95),
+                               p99=self._percentile(buckets, calls, longest, .99))
+        return result
+
+
+class PlanLog(object):
+    """Ring buffer of the last `size` plans captured from slow statements, newest last.
+
+    A statement is explained at most once per `interval` seconds, and then only for a
+    `sample` fraction of its slow runs.
+    """
+    def __init__(self, size=100, interval=60, sample=1.0):
+        self.interval = interval
+        self.sample = sample
+        self.plans = deque(maxlen=size)
+        # normalized statement: time of its last capture, the least recently captured first
+        self._captured = OrderedDict()
+
+    def __len__(self):
+        return len(self.plans)
+
+    def __iter__(self):
+        return iter(list(self.plans))
+
+    def clear(self):
+        self.plans.clear()
+        self._captured.clear()
+
+    def due(self, query):
+        """Returns the normalized statement when its plan should be captured now, else None."""
+        key = normalize(query)
+        now = time.time()
+        if now - self._captured.get(key, 0) < self.interval or random.random() >= self.sample:
+            return None
+        self._captured.pop(key, None)
+        self._captured[key] = now
+        # forget the statements whose interval has passed anyway
+        while len(self._captured) > self.plans.maxlen * 10:
+            self._captured.popitem(last=False)
+        return key
+
+    def add(self, query, statement, parameters, seconds, plan):
+        self.plans.append(dict(query=query, statement=statement, parameters=parameters,
+                               seconds=seconds, plan=plan, captured=time.time()))
@@ -0,0 +1,307 @@
+"""Tornado support, driving psycopg2's asynchronous connections from the IOLoop.
+
+http://initd.org/psycopg/docs/advanced.html#asynchronous-support
+"""
+from __future__ import absolute_import
+
+import logging
+from collections import deque
+
+import psycopg2
+import psycopg2.extras
+import psycopg2.extensions
+from psycopg2.extras import Json
+from psycopg2.extensions import POLL_OK, POLL_READ, POLL_WRITE
+
+from tornado.ioloop import IOLoop
+from tornado.concurrent import Future
+
+from tornpsql import (Row, InterfaceError, OperationalError, _RE_WS, _HSTORE_OIDS, _logging_enabled,
+                      _connection_args, _session_statements, _positional)
+
+
+def _rows(cursor):
+    if cursor.description:
+        column_names = [column.name for column in cursor.description]
+        return [Row(zip(column_names, row)) for row in cursor.fetchall()]
+
+
+def _row(cursor):
+    rows = _rows(cursor)
+    if not rows:
+        return None
+    elif len(rows) > 1:
+        raise ValueError('Multiple rows returned for get() query')
+    else:
+        return rows[0]
+
+
+def _register_hstore(cursor):
+    oids = cursor.fetchone()
+    if oids:
+        psycopg2.extras.register_hstore(None, globally=True, oid=oids[0], array_oid=oids[1])
+    psycopg2.extensions.register_adapter(dict, Json)
+
+
+class TornadoConnection(object):
+    """A non-blocking connection whose socket is watched by the Tornado IOLoop.
+
+    Takes the same arguments as `Connection`, plus the `ioloop` to run on
+    (defaults to `IOLoop.current()` when first connecting). `query`, `get`
+    and `execute` return Futures. Statements are queued and sent one at a
+    time; use a `TornadoConnectionPool` to run them concurrently.
+    Connections are always in autocommit mode.
+    """
+    def __init__(self, host_or_url=None, database=None, user=None, password=None, port=5432,
+                 search_path=None, timezone=None, enable_logging=None, ioloop=None):
+        self._logging = _logging_enabled(enable_logging)
+        self._db_args, self._search_path, self._timezone = _connection_args(host_or_url, database, user, password,
+                                                                            port, search_path, timezone)
+        self.host = self._db_args['host']
+        self.database = self._db_args['database']
+        self._ioloop = ioloop
+        self._db = None
+        self._fd = None
+        # (query, parameters, future, finish) waiting to be sent
+        self._pending = deque()
+        # (cursor, future, finish) of the statement in flight
+        self._current = None
+        self._listeners = {}
+
+    def __del__(self):
+        if getattr(self, '_db', None) is not None:
+            self.close()
+
+    @property
+    def closed(self):
+        return self._db is None or bool(self._db.closed)
+
+    @property
+    def busy(self):
+        """Number of statements queued or in flight."""
+        return len(self._pending) + (self._current is not None)
+
+    def close(self, error=None):
+        """Closes this database connection, failing any queued statements."""
+        if self._db is not None:
+            self._ioloop.remove_handler(self._fd)
+            self._db.close()
+            self._db = self._fd = None
+        error = error or InterfaceError('connection already closed')
+        if self._current is not None:
+            self._pending.appendleft((None, None, self._current[1], None))
+            self._current = None
+        while self._pending:
+            future = self._pending.popleft()[2]
+            if future is not None and not future.done():
+                future.set_exception(error)
+
+    def connect(self):
+        """Returns a Future resolved once the connection is open."""
+        return self._run('select 1;', None, None, lambda cursor: self)
+
+    def _open(self):
+        if self._ioloop is None:
+            self._ioloop = IOLoop.current()
+        statements = [(_HSTORE_OIDS, None, None, _register_hstore)]
+        statements.extend((statement, None, None, None)
+                          for statement in _session_statements(self._search_path, self._timezone))
+        if self._listeners:
+            statements.append((''.join('LISTEN %s;' % c for c in self._listeners), None, None, None))
+        self._pending.extendleft(reversed(statements))
+
+        self._db = psycopg2.connect(async_=1, **self._db_args)
+        self._fd = self._db.fileno()
+        self._current = (None, None, None)
+        self._ioloop.add_handler(self._fd, self._handle_events, IOLoop.WRITE)
+        self._poll()
+
+    def _run(self, query, parameters, kwargs, finish):
+        """Queues a statement, returning a Future for `finish(cursor)`."""
+        future = Future()
+        if kwargs:
+            query, parameters = _positional(query, kwargs)
+        self._pending.append((query, parameters or None, future, finish))
+        if self._db is None:
+            try:
+                self._open()
+            except OperationalError as e:
+                logging.error("Error connecting to PostgreSQL on %s, %s", self.host, e)
+                self.close(e)
+        elif self._current is None:
+            self._next()
+        return future
+
+    def _next(self):
+        """Sends the next queued statement, or waits for notifications when there is none."""
+        while self._current is None and self._pending:
+            query, parameters, future, finish = self._pending.popleft()
+            if self._logging:
+                logging.info(_RE_WS.sub(' ', query))
+            cursor = None
+            try:
+                cursor = self._db.cursor()
+                cursor.execute(query, parameters)
+            except Exception as e:
+                if cursor is not None:
+                    cursor.close()
+                if future is not None:
+                    future.set_exception(e)
+                if isinstance(e, (OperationalError, InterfaceError)):
+                    # the connection is gone, reconnect for the next statement
+                    logging.error("Error connecting to PostgreSQL on %s, %s", self.host, e)
+                    self.close(e)
+                    return
+                continue
+            self._current = (cursor, future, finish)
+            self._poll()
+            return
+        if self._current is None and self._db is not None:
+            self._ioloop.update_handler(self._fd, IOLoop.READ)
+
+    def _handle_events(self, fd, events):
+        self._poll()
+
+    def _poll(self):
+        cursor, future, finish = self._current or (None, None, None)
+        try:
+            state = self._db.poll()
+        except Exception as e:
+            self._current = None
+            if cursor is not None:
+                cursor.close()
+            if future is not None:
+                future.set_exception(e)
+            if isinstance(e, OperationalError):
+                logging.error("Error connecting to PostgreSQL on %s, %s", self.host, e)
+                self.close(e)
+            else:
+                self._next()
+            return
+
+        if state == POLL_OK:
+            self._notify()
+            if cursor is not None:
+                try:
+                    result = finish(cursor) if finish else None
+                except Exception as e:
+                    if future is not None:
+                        future.set_exception(e)
+                else:
+                    if future is not None:
+                        future.set_result(result)
+                finally:
+                    cursor.close()
+            self._current = None
+            self._next()
+        elif state == POLL_READ:
+            self._ioloop.update_handler(self._fd, IOLoop.READ)
+        elif state == POLL_WRITE:
+            self._ioloop.update_handler(self._fd, IOLoop.WRITE)
+
+    def _notify(self):
+        """Hands received notifications to the listeners as IOLoop callbacks."""
+        notifies = self._db.notifies
+        for notify in notifies:
+            for callback in self._listeners.get(notify.channel, ()):
+                self._ioloop.add_callback(callback, notify)
+        del notifies[:]
+
+    def query(self, query, *parameters, **kwargs):
+        """Returns a Future for the row list of the given query and parameters."""
+        return self._run(query, parameters, kwargs, _rows)
+
+    def get(self, query, *parameters, **kwargs):
+        """Returns a Future for the first row returned for the given query."""
+        return self._run(query, parameters, kwargs, _row)
+
+    def execute(self, query, *parameters, **kwargs):
+        """Same as query, but do not process results. The Future resolves to `None`."""
+        return self._run(query, parameters, kwargs, None)
+
+    def listen(self, channels, callback):
+        """Calls `callback(notify)` on the IOLoop for every notification on `channels`.
+        Returns a Future resolved once the LISTEN has been issued.
+        """
+        assert type(channels) in (tuple, list), 'Invalid channels. Must be tuple or list of strings'
+        new = [c for c in channels if c not in self._listeners]
+        for channel in channels:
+            self._listeners.setdefault(channel, []).append(callback)
+        return self.execute(''.join('LISTEN %s;' % c for c in new) or 'select 1;')
+
+    def unlisten(self, channels=None, callback=None):
+        """Stops delivering notifications on `channels` (all by default) to `callback` (all by default)."""
+        channels = list(self._listeners) if channels is None else channels
+        assert type(channels) in (tuple, list), 'Invalid channels. Must be tuple or list of strings'
+        removed = []
+        for channel in channels:
+            callbacks = self._listeners.get(channel, [])
+            if callback is not None and callback in callbacks:
+                callbacks.remove(callback)
+            if callback is None or not callbacks:
+                self._listeners.pop(channel, None)
+                removed.append(channel)
+        return self.execute(''.join('UNLISTEN %s;' % c for c in removed) or 'select 1;')
+
+
+class TornadoConnectionPool(object):
+    """Spreads statements over up to `maxconn` `TornadoConnection` objects.
+
+    Takes the same arguments as `TornadoConnection`. A statement goes to an
+    idle connection, a new connection while there are fewer than `maxconn`,
+    or else to the connection with the shortest queue. Notifications are
+    received on a connection of their own.
+    """
+    connection_class = TornadoConnection
+
+    def __init__(self, *args, **kwargs):
+        self.maxconn = kwargs.pop('maxconn', 10)
+        assert self.maxconn > 0, 'Invalid pool size. Must be maxconn > 0'
+        self._args = args
+        self._kwargs = kwargs
+        self._connections = []
+        self._listener = None
+
+    @property
+    def size(self):
+        return len(self._connections)
+
+    def _connection(self):
+        for conn in self._connections:
+            if not conn.busy:
+                return conn
+        if len(self._connections) < self.maxconn:
+            self._connections.append(self.connection_class(*self._args, **self._kwargs))
+            return self._connections[-1]
+        return min(self._connections, key=lambda conn: conn.busy)
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+
+    def query(self, query, *parameters, **kwargs):
+        """Returns a Future for the row list of the given query and parameters."""
+        return self._connection().query(query, *parameters, **kwargs)
+
+    def get(self, query, *parameters, **kwargs):
+        """Returns a Future for the first row returned for the given query."""
+        return self._connection().get(query, *parameters, **kwargs)
+
+    def execute(self, query, *parameters, **kwargs):
+        """Same as query, but do not process results. The Future resolves to `None`."""
+        return self._connection().execute(query, *parameters, **kwargs)
+
+    def listen(self, channels, callback):
+        """See `TornadoConnection.listen`."""
+        if self._listener is None:
+            self._listener = self.connection_class(*self._args, **self._kwargs)
+        return self._listener.listen(channels, callback)
+
+    def unlisten(self, channels=None, callback=None):
+        """See `TornadoConnection.unlisten`."""
+        if self._listener is not None:
+            return self._listener.unlisten(channels, callback)
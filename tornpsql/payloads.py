@@ -0,0 +1,85 @@
+"""Splitting of payloads over the NOTIFY size limit into chunks, and their reassembly.
+
+https://www.postgresql.org/docs/current/static/sql-notify.html
+"""
+import re
+import zlib
+import uuid
+import base64
+import binascii
+from collections import OrderedDict
+
+from psycopg2.extensions import Notify
+
+# starts and ends the header of a chunk: \x1f<message id> <index> <count> <b|z>\x1f
+_MARK = u'\x1f'
+# messages waiting for their missing chunks, before the oldest is dropped
+_MAX_PARTIAL = 1000
+_RE_CHUNK = re.compile(u'^\x1f([0-9a-f]{32}) ([0-9]+) ([0-9]+) ([bz])\x1f(.*)$', re.S)
+
+
+def _encode(payload):
+    return payload if isinstance(payload, bytes) else payload.encode('utf-8')
+
+
+def split(payload, limit, compress=False):
+    """Returns a list of the payload alone when it fits in `limit` bytes, else of chunks that do.
+
+    Chunks carry base64, of the zlib compressed payload when `compress` is true.
+    """
+    data = _encode(payload)
+    if len(data) <= limit and not data.startswith(_MARK.encode('ascii')):
+        return [payload]
+    kind = u'b'
+    if compress:
+        data, kind = zlib.compress(data), u'z'
+    data = base64.b64encode(data).decode('ascii')
+    message = uuid.uuid4().hex
+    size = limit - len(u'%s%s 000000 000000 b%s' % (_MARK, message, _MARK))
+    assert size > 0, 'Invalid payload limit. Must leave room for the chunk header'
+    pieces = [data[i:i + size] for i in range(0, len(data), size)]
+    return [u'%s%s %d %d %s%s%s' % (_MARK, message, i, len(pieces), kind, _MARK, piece)
+            for i, piece in enumerate(pieces)]
+
+
+class Reassembler(object):
+    """Joins the chunks of split payloads back into single notifications.
+
+    Payloads that only look like chunks, e.g. from other publishers, are passed through unchanged.
+    """
+    def __init__(self):
+        self._partial = OrderedDict()
+
+    def __call__(self, notifies):
+        """Returns the notifications, with the chunks replaced by the notification they complete."""
+        if not any(n.payload.startswith(_MARK) for n in notifies):
+            return notifies
+        complete = []
+        for notify in notifies:
+            match = _RE_CHUNK.match(notify.payload)
+            if match is None:
+                complete.append(notify)
+                continue
+            message, index, count, kind, piece = match.groups()
+            index, count = int(index), int(count)
+            key = (notify.pid, notify.channel, message)
+            pieces = self._partial.pop(key, None) or [None] * count
+            if index >= count or len(pieces) != count:
+                complete.append(notify)
+                continue
+            pieces[index] = piece
+            if None in pieces:
+                self._partial[key] = pieces
+                if len(self._partial) > _MAX_PARTIAL:
+                    self._partial.popitem(last=False)
+                continue
+            try:
+                data = base64.b64decode(u''.join(pieces).encode('ascii'))
+                if kind == u'z':
+                    data = zlib.decompress(data)
+                payload = data.decode('utf-8')
+            except (ValueError, binascii.Error, zlib.error):
+                complete.append(notify)
+                continue
+            complete.append(Notify(notify.pid, notify.channel, payload))
+        return complete
@@ -0,0 +1,333 @@
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from psycopg2.pool import PoolError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from tornpsql import Connection, TransactionalConnection, Error, QueryCanceledError, basestring
+
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+class PoolTimeout(PoolError):
+    """No connection could be checked out before the timeout expired."""
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of `Connection` objects.
+
+    Takes the same arguments as `Connection`, plus the pool options:
+
+    - `minconn`: connections opened up front and never evicted for idleness
+    - `maxconn`: upper bound on open connections
+    - `timeout`: seconds `getconn()` blocks before raising `PoolTimeout` (`None` waits forever)
+    - `max_idle`: seconds a surplus connection may sit idle before it is closed
+    - `max_lifetime`: seconds after which a connection is recycled when checked in
+    - `check_after`: idle seconds after which a connection is pinged on checkout
+    """
+    connection_class = Connection
+
+    def __init__(self, *args, **kwargs):
+        self.minconn = kwargs.pop('minconn', 1)
+        self.maxconn = kwargs.pop('maxconn', 10)
+        self.timeout = kwargs.pop('timeout', None)
+        self.max_idle = kwargs.pop('max_idle', 600)
+        self.max_lifetime = kwargs.pop('max_lifetime', 3600)
+        self.check_after = kwargs.pop('check_after', 5)
+        assert 0 <= self.minconn <= self.maxconn, 'Invalid pool size. Must be 0 <= minconn <= maxconn'
+
+        self._args = args
+        self._kwargs = kwargs
+        self._lock = threading.Condition()
+        # (connection, last used) with the most recently used on the right
+        self._idle = deque()
+        self._created = {}
+        # checked out connections by id
+        self._used = {}
+        self._size = 0
+        self._closed = False
+
+        for _ in range(self.minconn):
+            self._size += 1
+            self._idle.append((self._open(), _now()))
+
+    @property
+    def size(self):
+        """Number of open connections, idle or checked out."""
+        return self._size
+
+    @property
+    def idle(self):
+        """Number of connections waiting to be checked out."""
+        return len(self._idle)
+
+    def _open(self):
+        conn = self.connection_class(*self._args, **self._kwargs)
+        if conn._db is None:
+            # _Connection logs and swallows the initial connect error
+            conn.reconnect()
+        self._created[id(conn)] = _now()
+        return conn
+
+    def _discard(self, conn):
+        """Forget about `conn`. Must be called holding the lock."""
+        self._size -= 1
+        if conn is not None:
+            self._created.pop(id(conn), None)
+        self._lock.notify()
+
+    def _evict(self):
+        """Close surplus connections idle for longer than `max_idle`. Must be called holding the lock."""
+        if self.max_idle is None:
+            return
+        expired = _now() - self.max_idle
+        while self._idle and self._size > self.minconn and self._idle[0][1] < expired:
+            conn, _ = self._idle.popleft()
+            self._discard(conn)
+            conn.close()
+
+    def _check(self, conn, used):
+        """Make sure a connection coming out of the pool is usable."""
+        if conn._db is None or conn._db.closed:
+            conn.reconnect()
+            self._created[id(conn)] = _now()
+        elif self.check_after is not None and _now() - used >= self.check_after:
+            try:
+                conn.ping()
+            except Error:
+                conn.reconnect()
+                self._created[id(conn)] = _now()
+
+    def _reset(self, conn):
+        """Prepare a connection coming back into the pool for the next user."""
+        conn._change_path = None
+        conn._next_row_class = None
+
+    def getconn(self, timeout=None):
+        """Checks out a connection, blocking up to `timeout` seconds when the pool is exhausted."""
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else _now() + timeout
+        conn = used = None
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolError('connection pool is closed')
+                self._evict()
+                if self._idle:
+                    conn, used = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    break
+                remaining = None if deadline is None else deadline - _now()
+                if remaining is not None and remaining <= 0:
+                    raise PoolTimeout('No connection available after %ss' % timeout)
+                self._lock.wait(remaining)
+
+        try:
+            if conn is None:
+                conn = self._open()
+            else:
+                self._check(conn, used)
+        except Exception:
+            with self._lock:
+                self._discard(conn)
+            if conn is not None:
+                conn.close()
+            raise
+        with self._lock:
+            self._used[id(conn)] = conn
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Returns a connection to the pool, closing it if broken, too old or `close` is given."""
+        with self._lock:
+            if self._used.pop(id(conn), None) is not conn:
+                raise PoolError('connection is not checked out from this pool')
+        if not close:
+            created = self._created.get(id(conn), 0)
+            close = (self._closed or conn._db is None or conn._db.closed or
+                     (self.max_lifetime is not None and _now() - created > self.max_lifetime))
+        if not close:
+            try:
+                self._reset(conn)
+            except Error:
+                close = True
+
+        with self._lock:
+            if close:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, _now()))
+                self._lock.notify()
+        if close:
+            conn.close()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Checks out a connection for the duration of the `with` block."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self):
+        """Closes all idle connections. Checked out connections are closed when returned."""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+                conn.close()
+            self._lock.notify_all()
+
+    def mogrify(self, query, *parameters, **kwargs):
+        with self.connection() as db:
+            return db.mogrify(query, *parameters, **kwargs)
+
+    def query(self, query, *parameters, **kwargs):
+        """Returns a row list for the given query and parameters."""
+        with self.connection() as db:
+            return db.query(query, *parameters, **kwargs)
+
+    def get(self, query, *parameters, **kwargs):
+        """Returns the first row returned for the given query."""
+        with self.connection() as db:
+            return db.get(query, *parameters, **kwargs)
+
+    def iter(self, query, *parameters, **kwargs):
+        """Returns a generator for records from the query, holding a connection until it is exhausted."""
+        with self.connection() as db:
+            for row in db.iter(query, *parameters, **kwargs):
+                yield row
+
+    def execute(self, query, *parameters, **kwargs):
+        """Same as query, but do not process results. Always returns `None`."""
+        with self.connection() as db:
+            return db.execute(query, *parameters, **kwargs)
+
+    def executemany(self, query, *parameters):
+        """Executes the given query against all the given param sequences."""
+        with self.connection() as db:
+            return db.executemany(query, *parameters)
+
+    def file(self, path):
+        """Runs the statements of the SQL file in one transaction."""
+        with self.connection() as db:
+            db.file(path)
+
+    def migrate(self, *paths):
+        """Runs the SQL files not run before, or changed since, in one transaction, and returns their paths."""
+        with self.connection() as db:
+            return db.migrate(*paths)
+
+    def gather(self, queries, max_workers=None, timeout=None):
+        """Runs independent queries concurrently on up to `max_workers` connections (`maxconn` by default),
+        returning a row list per query in the order given.
+
+        `queries` are query strings or `(query, parameters)` pairs, parameters being a tuple or a
+        dict of keyword arguments. When a query fails, or `timeout` seconds pass, the queries still
+        running are cancelled, those not started are skipped and the error is raised, a
+        `QueryCanceledError` for the timeout.
+        """
+        queries = [(query, None) if isinstance(query, basestring) else tuple(query) for query in queries]
+        results = [None] * len(queries)
+        deadline = None if timeout is None else _now() + timeout
+        pending = iter(range(len(queries)))
+        # connections running a query, to cancel, the errors and the workers that returned
+        running = {}
+        errors = []
+        finished = []
+        done = threading.Condition()
+
+        def work():
+            try:
+                run()
+            finally:
+                with done:
+                    finished.append(True)
+                    done.notify_all()
+
+        def run():
+            while True:
+                with done:
+                    index = next(pending, None)
+                    if index is None or errors:
+                        return
+                try:
+                    remaining = None if deadline is None else max(deadline - _now(), 0)
+                    with self.connection(remaining) as db:
+                        with done:
+                            if errors:
+                                return
+                            running[index] = db
+                        try:
+                            query, parameters = queries[index]
+                            if isinstance(parameters, dict):
+                                results[index] = db.query(query, **parameters)
+                            else:
+                                results[index] = db.query(query, *(parameters or ()))
+                        finally:
+                            with done:
+                                running.pop(index)
+                except Exception as e:
+                    with done:
+                        errors.append(e)
+                        cancel()
+                    return
+
+        def cancel():
+            """Cancels the running queries. Must be called holding the condition."""
+            for db in running.values():
+                if db._db is not None:
+                    db._db.cancel()
+
+        workers = [threading.Thread(target=work) for _ in range(min(max_workers or self.maxconn, len(queries)))]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        with done:
+            while not errors and len(finished) < len(workers):
+                remaining = None if deadline is None else deadline - _now()
+                if remaining is not None and remaining <= 0:
+                    errors.append(QueryCanceledError('gather() did not finish within %ss' % timeout))
+                    cancel()
+                    break
+                done.wait(remaining)
+        for worker in workers:
+            worker.join()
+        if errors:
+            raise errors[0]
+        return results
+
+
+class TransactionalConnectionPool(ConnectionPool):
+    """A pool of `TransactionalConnection` objects.
+
+    `connection()` commits when the block exits cleanly and rolls back otherwise,
+    so each `query`/`get`/`execute` call on the pool runs in its own transaction.
+    """
+    connection_class = TransactionalConnection
+
+    def _reset(self, conn):
+        super(TransactionalConnectionPool, self)._reset(conn)
+        if conn._db.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Checks out a connection and wraps the `with` block in a transaction."""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            # an uncommitted transaction is rolled back by _reset
+            self.putconn(conn)
+
+    transaction = connection
@@ -0,0 +1,42 @@
+"""When and how often statements lost with their connection are run again."""
+import time
+import random
+
+_now = getattr(time, 'monotonic', time.time)
+
+# connection_exception, and the server shutting down or not yet accepting connections
+_LOST_CONNECTION_CODES = ('57P01', '57P02', '57P03')
+
+
+def connection_lost(error):
+    """Whether the error means the connection is gone, rather than the statement failed."""
+    return error.pgcode is None or error.pgcode.startswith('08') or error.pgcode in _LOST_CONNECTION_CODES
+
+
+class RetryPolicy(object):
+    """Up to `attempts` tries in all, within `deadline` seconds of the first (`None` for no deadline).
+
+    The n-th retry waits `backoff * 2 ** (n - 1)` seconds, at most `max_backoff`. With
+    `jitter` the wait is drawn uniformly below that, so clients that lost their
+    connections together do not reconnect together.
+    """
+    def __init__(self, attempts=3, backoff=.1, max_backoff=2., deadline=None, jitter=True):
+        assert attempts >= 1, 'Invalid attempts. Must be attempts >= 1'
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.jitter = jitter
+
+    def delays(self):
+        """Yields the seconds to wait before each retry, ending when the attempts or the deadline are used up."""
+        start = _now()
+        waited = 0
+        for retry in range(1, self.attempts):
+            delay = min(self.max_backoff, self.backoff * 2 ** (retry - 1))
+            if self.jitter:
+                delay = random.uniform(0, delay)
+            if self.deadline is not None and max(_now() - start, waited) + delay >= self.deadline:
+                return
+            waited += delay
+            yield delay
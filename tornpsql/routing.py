@@ -0,0 +1,149 @@
+import time
+import logging
+import itertools
+import threading
+
+from tornpsql import ConnectionPool, Error, OperationalError, _declarable
+
+
+_now = getattr(time, 'monotonic', time.time)
+
+
+class RoutingConnection(object):
+    """Sends reads to streaming replicas and everything else to the primary, each host through a `ConnectionPool`.
+
+    `primary` and each of `replicas` is a url or a dict of `Connection` arguments, merged
+    over the other keyword arguments, which are passed to every pool. The routing options:
+
+    - `policy`: `round_robin` or `least_latency`, how the replica of each read is picked
+    - `max_lag`: seconds of replay lag past which a replica gets no reads (`None` never skips)
+    - `check_interval`: seconds between background checks of lag and latency (`None` checks once)
+    - `sticky`: seconds a thread's reads go to the primary after it wrote, to read its own writes
+
+    `query`, `get` and `iter` go to a replica when the query could back a server-side cursor,
+    i.e. is a single statement that neither writes nor locks rows. `primary()` and `replica()`
+    return the pools to choose explicitly.
+    """
+    pool_class = ConnectionPool
+    # replay lag in seconds, none when the replica has replayed all it received
+    lag_query = """select case when not pg_is_in_recovery() or pg_last_xlog_receive_location() = pg_last_xlog_replay_location()
+                               then 0 else coalesce(extract(epoch from now() - pg_last_xact_replay_timestamp()), 0)
+                           end as lag;"""
+    lag_query_10 = lag_query.replace('xlog', 'wal').replace('location', 'lsn')
+
+    def __init__(self, primary, replicas=(), **kwargs):
+        self.policy = kwargs.pop('policy', 'round_robin')
+        self.max_lag = kwargs.pop('max_lag', None)
+        self.check_interval = kwargs.pop('check_interval', 5)
+        self.sticky = kwargs.pop('sticky', 0)
+        assert self.policy in ('round_robin', 'least_latency'), 'Invalid policy. Must be round_robin or least_latency'
+
+        self._primary = self._pool(primary, kwargs)
+        self._replicas = [self._pool(replica, kwargs) for replica in replicas]
+        # replicas within max_lag, and the latency of their last check by replica
+        self._healthy = list(self._replicas)
+        self._latency = dict((replica, 0) for replica in self._replicas)
+        self._turn = itertools.count()
+        self._local = threading.local()
+        self._closed = threading.Event()
+        self._checker = None
+        if self._replicas:
+            self.check()
+            if self.check_interval is not None:
+                self._checker = threading.Thread(target=self._check_every)
+                self._checker.daemon = True
+                self._checker.start()
+
+    def _pool(self, target, kwargs):
+        if isinstance(target, dict):
+            return self.pool_class(**dict(kwargs, **target))
+        return self.pool_class(target, **kwargs)
+
+    @property
+    def replicas(self):
+        """The replicas currently given reads."""
+        return list(self._healthy)
+
+    def check(self):
+        """Measures the lag and latency of every replica, leaving those past `max_lag` or failing out of the rotation."""
+        healthy = []
+        for replica in self._replicas:
+            start = _now()
+            try:
+                with replica.connection() as db:
+                    lag = db.get(self.lag_query_10 if db._db.server_version >= 100000 else self.lag_query).lag
+            except Error as e:
+                logging.warning('Replica check failed, leaving it out of the rotation: %s', e)
+                continue
+            self._latency[replica] = _now() - start
+            if self.max_lag is None or lag <= self.max_lag:
+                healthy.append(replica)
+        self._healthy = healthy
+
+    def _check_every(self):
+        while not self._closed.wait(self.check_interval):
+            self.check()
+
+    def primary(self):
+        """Returns the pool of the primary, to read from it explicitly."""
+        return self._primary
+
+    def replica(self):
+        """Returns the pool of the replica the next read would go to, the primary's when none is usable."""
+        healthy = self._healthy
+        if not healthy or _now() - getattr(self._local, 'written', float('-inf')) < self.sticky:
+            return self._primary
+        if self.policy == 'least_latency':
+            return min(healthy, key=lambda replica: self._latency.get(replica, 0))
+        return healthy[next(self._turn) % len(healthy)]
+
+    def _reader(self, query):
+        return self.replica() if _declarable(query) else self._writer()
+
+    def _writer(self):
+        if self.sticky:
+            self._local.written = _now()
+        return self._primary
+
+    def _read(self, method, query, parameters, kwargs):
+        db = self._reader(query)
+        try:
+            return getattr(db, method)(query, *parameters, **kwargs)
+        except OperationalError as e:
+            if db is self._primary:
+                raise
+            # until the next check puts it back
+            logging.warning('Replica failed, reading from the primary: %s', e)
+            self._healthy = [replica for replica in self._healthy if replica is not db]
+            return getattr(self._primary, method)(query, *parameters, **kwargs)
+
+    def query(self, query, *parameters, **kwargs):
+        """Returns a row list for the given query and parameters, read from a replica when it only reads."""
+        return self._read('query', query, parameters, kwargs)
+
+    def get(self, query, *parameters, **kwargs):
+        """Returns the first row returned for the given query, read from a replica when it only reads."""
+        return self._read('get', query, parameters, kwargs)
+
+    def iter(self, query, *parameters, **kwargs):
+        """Returns a generator for records from the query, read from a replica when it only reads."""
+        return self._reader(query).iter(query, *parameters, **kwargs)
+
+    def mogrify(self, query, *parameters, **kwargs):
+        return self._primary.mogrify(query, *parameters, **kwargs)
+
+    def execute(self, query, *parameters, **kwargs):
+        """Runs the statement on the primary. Always returns `None`."""
+        return self._writer().execute(query, *parameters, **kwargs)
+
+    def executemany(self, query, *parameters):
+        """Runs the statement on the primary for all the given param sequences."""
+        return self._writer().executemany(query, *parameters)
+
+    def close(self):
+        """Stops checking the replicas and closes every pool."""
+        self._closed.set()
+        if self._checker is not None:
+            self._checker.join()
+        for pool in [self._primary] + self._replicas:
+            pool.close()
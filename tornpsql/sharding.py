@@ -0,0 +1,196 @@
+import zlib
+import heapq
+import bisect
+import itertools
+import threading
+from operator import itemgetter
+
+from tornpsql import ConnectionPool, NotSupportedError, basestring
+
+
+class HashShardMap(object):
+    """Maps keys to one of `shards` shards by the CRC-32 of their text, the same in every process."""
+    def __init__(self, shards):
+        self.shards = shards
+
+    def __call__(self, key):
+        data = key if isinstance(key, bytes) else (u'%s' % key).encode('utf-8')
+        return (zlib.crc32(data) & 0xffffffff) % self.shards
+
+
+class RangeShardMap(object):
+    """Maps keys to shards by range: keys below `bounds[0]` go to the first shard,
+    keys from `bounds[i - 1]` and below `bounds[i]` to shard `i`, and so on.
+    """
+    def __init__(self, bounds):
+        self.bounds = sorted(bounds)
+
+    def __call__(self, key):
+        return bisect.bisect_right(self.bounds, key)
+
+
+class _Descending(object):
+    """Inverts the order of a sort key."""
+    __slots__ = ('key', )
+
+    def __init__(self, key):
+        self.key = key
+
+    def __lt__(self, other):
+        return other.key < self.key
+
+    def __eq__(self, other):
+        return self.key == other.key
+
+
+class ShardedConnection(object):
+    """Routes statements by shard key to one `ConnectionPool` per shard, and scatters those without one.
+
+    Each of `shards` is a url or a dict of `Connection` arguments, merged over the other
+    keyword arguments, which are passed to every pool. `shard_map` is any callable returning
+    the index of the shard of a key, a `HashShardMap` by default.
+
+    `shard(key)` returns the pool of the key's shard. `query`, `get` and `iter` run on every
+    shard, concurrently, in shard order, and `merged()` merges sorted results across the shards
+    instead. Writes go to `shard(key)`, or to every shard through `all_shards()` only.
+    """
+    pool_class = ConnectionPool
+
+    def __init__(self, shards, shard_map=None, **kwargs):
+        assert shards, 'Invalid shards. Must be at least one'
+        self.shards = [self._pool(shard, kwargs) for shard in shards]
+        self.shard_map = shard_map or HashShardMap(len(self.shards))
+
+    def _pool(self, target, kwargs):
+        if isinstance(target, dict):
+            return self.pool_class(**dict(kwargs, **target))
+        return self.pool_class(target, **kwargs)
+
+    def shard(self, key):
+        """Returns the pool of the shard holding `key`."""
+        return self.shards[self.shard_map(key)]
+
+    def _scatter(self, method, query, parameters, kwargs):
+        """Returns the result of the method on every shard, run concurrently, in shard order."""
+        if len(self.shards) == 1:
+            return [getattr(self.shards[0], method)(query, *parameters, **kwargs)]
+        results = [None] * len(self.shards)
+        errors = []
+
+        def run(index, pool):
+            try:
+                results[index] = getattr(pool, method)(query, *parameters, **kwargs)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=item) for item in enumerate(self.shards)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def _concat(self, results):
+        if all(rows is None for rows in results):
+            return None
+        return list(itertools.chain.from_iterable(rows or () for rows in results))
+
+    def query(self, query, *parameters, **kwargs):
+        """Returns the rows returned by every shard for the given query and parameters."""
+        return self._concat(self._scatter('query', query, parameters, kwargs))
+
+    def get(self, query, *parameters, **kwargs):
+        """Returns the one row returned by all the shards together for the given query."""
+        rows = self.query(query, *parameters, **kwargs)
+        if not rows:
+            return None
+        elif len(rows) > 1:
+            raise ValueError('Multiple rows returned for get() query')
+        else:
+            return rows[0]
+
+    def iter(self, query, *parameters, **kwargs):
+        """Returns a generator for the records from every shard, one shard after the other."""
+        return itertools.chain.from_iterable(pool.iter(query, *parameters, **kwargs) for pool in self.shards)
+
+    def execute(self, query, *parameters, **kwargs):
+        """Refused: a write without a key goes through `shard(key)`, or `all_shards()` when meant for every shard."""
+        raise NotSupportedError('Statements without a shard key run through shard(key).execute() '
+                                'or, on every shard, all_shards().execute()')
+
+    def executemany(self, query, *parameters):
+        """Refused: rows go through `shard(key)`, or `all_shards()` when every shard should get all of them."""
+        raise NotSupportedError('Statements without a shard key run through shard(key).executemany() '
+                                'or, on every shard, all_shards().executemany()')
+
+    def all_shards(self):
+        """Returns an object whose `execute` and `executemany` run on every shard, concurrently,
+        e.g. `db.all_shards().execute('create table ...')`.
+        """
+        return _AllShards(self)
+
+    def merged(self, order_by, limit=None, reverse=False):
+        """Returns an object whose `query` and `iter` merge the rows of the shards, each sorted by
+        `order_by`, into one sorted result of at most `limit` rows, e.g.
+        `db.merged('created', limit=10, reverse=True).query('... order by created desc limit 10')`.
+
+        `order_by` is a column name, a list of column names or a function of the row.
+        """
+        return _Merged(self, order_by, limit, reverse)
+
+    def close(self):
+        for pool in self.shards:
+            pool.close()
+
+
+class _AllShards(object):
+    """The writes of `db.all_shards()`, run on every shard."""
+    def __init__(self, db):
+        self._db = db
+
+    def execute(self, query, *parameters, **kwargs):
+        """Runs the statement on every shard. Always returns `None`."""
+        self._db._scatter('execute', query, parameters, kwargs)
+
+    def executemany(self, query, *parameters):
+        """Runs the statement for all the given param sequences on every shard."""
+        return self._db._concat(self._db._scatter('executemany', query, parameters, {}))
+
+
+class _Merged(object):
+    """The statements of `db.merged()`, merged across shards by a k-way merge."""
+    def __init__(self, db, order_by, limit, reverse):
+        if isinstance(order_by, basestring):
+            order_by = itemgetter(order_by)
+        elif not callable(order_by):
+            order_by = itemgetter(*order_by)
+        self._db = db
+        self._key = (lambda row: _Descending(order_by(row))) if reverse else order_by
+        self._limit = limit
+
+    def _decorate(self, shard, rows):
+        # the shard and position break ties, so rows themselves are never compared
+        for i, row in enumerate(rows):
+            yield self._key(row), shard, i, row
+
+    def _merge(self, sources):
+        merged = (item[3] for item in heapq.merge(*[self._decorate(shard, rows) for shard, rows in enumerate(sources)]))
+        return itertools.islice(merged, self._limit) if self._limit is not None else merged
+
+    def query(self, query, *parameters, **kwargs):
+        """Returns the sorted rows of every shard merged, up to `limit` rows."""
+        results = self._db._scatter('query', query, parameters, kwargs)
+        return list(self._merge([rows or () for rows in results]))
+
+    def iter(self, query, *parameters, **kwargs):
+        """Returns a generator for the sorted records of every shard merged, streaming all shards at once."""
+        sources = [pool.iter(query, *parameters, **kwargs) for pool in self._db.shards]
+        try:
+            for row in self._merge(sources):
+                yield row
+        finally:
+            # hand the connections of shards not read to the end back to their pools
+            for source in sources:
+                source.close()